@@ -1,19 +1,35 @@
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from config import config
+from app.json_provider import FastJSONProvider
 
 db = SQLAlchemy()
 
 
-def create_app(config_name='default'):
-    """Application factory pattern"""
+def create_app(config_name='default', config_overrides=None):
+    """
+    Application factory pattern
+
+    Args:
+        config_name: Key of the configuration class in config.config
+        config_overrides: Optional settings applied on top of the configuration
+            before extensions are initialized (e.g. worker engine options)
+    """
     app = Flask(__name__)
+    app.json = FastJSONProvider(app)
     app.config.from_object(config[config_name])
+    if config_overrides:
+        app.config.update(config_overrides)
     config[config_name].init_app(app)
 
     # Initialize extensions
     db.init_app(app)
 
+    from app.metrics import init_metrics
+    from app.profiling import init_profiling
+    init_metrics(app)
+    init_profiling(app)
+
     from app.routes import main_bp, product_bp, webhook_bp
     app.register_blueprint(main_bp)
     app.register_blueprint(product_bp, url_prefix='/api/products')
@@ -3,6 +3,72 @@ from config import config
 import os
 
 
+# Named queues, each served by its own worker in run.sh
+QUEUE_INGEST_BULK = 'ingest_bulk'
+QUEUE_INGEST_SMALL = 'ingest_small'
+QUEUE_WEBHOOKS = 'webhooks'
+QUEUE_EXPORTS = 'exports'
+QUEUES = [QUEUE_INGEST_BULK, QUEUE_INGEST_SMALL, QUEUE_WEBHOOKS, QUEUE_EXPORTS]
+
+UPLOAD_TASK = 'app.tasks.process_csv_upload'
+INGEST_QUEUES = [QUEUE_INGEST_BULK, QUEUE_INGEST_SMALL]
+
+TASK_QUEUES = {
+    'app.tasks.process_csv_range': QUEUE_INGEST_BULK,
+    'app.tasks.finalize_csv_upload': QUEUE_INGEST_BULK,
+    'app.tasks.clear_failed_ranges': QUEUE_INGEST_BULK,
+    'app.tasks.delete_products': QUEUE_EXPORTS,
+    'app.tasks.purge_upload_files': QUEUE_EXPORTS,
+    'app.tasks.purge_webhook_deliveries': QUEUE_EXPORTS,
+    'app.tasks.deliver_webhook': QUEUE_WEBHOOKS,
+    'app.tasks.flush_webhook_batch': QUEUE_WEBHOOKS,
+}
+
+# Periodic tasks, run by the beat scheduler embedded in the exports worker (see run.sh)
+BEAT_SCHEDULE = {
+    'purge-upload-files': {'task': 'app.tasks.purge_upload_files', 'schedule': 3600},
+    'purge-webhook-deliveries': {'task': 'app.tasks.purge_webhook_deliveries', 'schedule': 3600},
+}
+
+# Rough expansion of compressed uploads when estimating the CSV size
+COMPRESSED_SIZE_FACTOR = 8
+
+
+def ingest_queue(size, filename, small_file_bytes):
+    """
+    Return the ingestion queue for an upload of a given size
+
+    Args:
+        size: Size of the uploaded file in bytes
+        filename: Name of the file, compressed uploads are weighted by COMPRESSED_SIZE_FACTOR
+        small_file_bytes: Largest estimated CSV size sent to the small-ingestion queue
+    """
+    if filename.lower().endswith(('.gz', '.zst')):
+        size *= COMPRESSED_SIZE_FACTOR
+    return QUEUE_INGEST_SMALL if size <= small_file_bytes else QUEUE_INGEST_BULK
+
+
+def make_router(app_config):
+    """
+    Build the task router
+
+    Uploads are routed by the size of their file on disk, so a large import
+    never delays small ones. Files that cannot be read go to the bulk queue.
+    """
+    def route_task(name, args, kwargs, options, task=None, **kw):
+        if name == UPLOAD_TASK:
+            file_path = args[0] if args else kwargs.get('file_path')
+            try:
+                size = os.path.getsize(file_path)
+            except (OSError, TypeError):
+                return {'queue': QUEUE_INGEST_BULK}
+            return {'queue': ingest_queue(size, file_path, app_config.INGEST_SMALL_FILE_BYTES)}
+        queue = TASK_QUEUES.get(name)
+        return {'queue': queue} if queue else None
+
+    return route_task
+
+
 def make_celery(app_name=__name__):
     """Create Celery instance"""
     config_name = os.environ.get('FLASK_ENV', 'default')
@@ -26,6 +92,14 @@ def make_celery(app_name=__name__):
         broker_connection_retry_on_startup=True,
         worker_prefetch_multiplier=1,
         worker_max_tasks_per_child=1000,
+        # Prefork children build their app and warm up database and Redis
+        # connections in worker_process_init (see app/worker.py), which must
+        # finish within this many seconds or the child is killed; the 4s
+        # default is too short when the database is slow to accept connections
+        worker_proc_alive_timeout=30,
+        task_default_queue=QUEUE_INGEST_BULK,
+        task_routes=(make_router(app_config),),
+        beat_schedule=BEAT_SCHEDULE,
     )
 
     return celery
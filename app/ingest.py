@@ -0,0 +1,744 @@
+"""
+Ingestion engines used by the CSV upload task
+"""
+import gzip
+import hashlib
+import io
+import os
+import time
+import numpy as np
+import pandas as pd
+from decimal import ROUND_HALF_UP, Decimal
+from contextlib import contextmanager, nullcontext
+
+try:
+    import pyarrow
+    import pyarrow.csv as pyarrow_csv
+except ImportError:
+    pyarrow = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+from sqlalchemy.sql import text
+from app import db
+from app.models import CONTENT_HASH_SQL, Product, UploadError, upload_staging, utc_now
+
+
+INGEST_MODES = ['bulk', 'orm']
+CSV_PARSERS = ['pandas', 'pyarrow']
+
+# Columns read from uploaded CSV files
+IMPORT_COLUMNS = ['sku', 'name', 'description', 'price']
+
+# Columns a CSV header must contain
+REQUIRED_COLUMNS = ['sku', 'name']
+
+# Validation limits, matching the products columns
+NAME_MAX_LENGTH = Product.__table__.c.name.type.length
+PRICE_LIMIT = 10 ** 8  # Numeric(10, 2)
+PRICE_STEP = Decimal('0.01')
+
+# Largest record buffered while looking for the end of a quoted field; an
+# unterminated quote fails the upload instead of swallowing the rest of the file
+MAX_RECORD_BYTES = 16 * 1024 * 1024
+
+# Accepted upload extensions and the compression each one implies
+CSV_EXTENSIONS = {'.csv': None, '.csv.gz': 'gzip', '.csv.zst': 'zstd'}
+
+STAGING_TABLE = 'products_staging'
+STAGING_COLUMNS = ['position', 'sku', 'name', 'description', 'price']
+
+CREATE_STAGING_SQL = f"""
+    CREATE TEMP TABLE IF NOT EXISTS {STAGING_TABLE} (
+        position BIGINT NOT NULL,
+        sku CITEXT NOT NULL,
+        name TEXT,
+        description TEXT,
+        price NUMERIC(10, 2)
+    )
+"""
+
+RANGE_STAGING_TABLE = upload_staging.name
+RANGE_STAGING_COLUMNS = ['job_id', 'position', 'sku', 'name', 'description', 'price']
+
+ERROR_TABLE = UploadError.__tablename__
+ERROR_COLUMNS = ['job_id', 'row', 'position', 'error', 'sku', 'name', 'description', 'price']
+
+MERGED_NAME_SQL = "CASE WHEN EXCLUDED.name = '' THEN p.name ELSE EXCLUDED.name END"
+MERGED_DESCRIPTION_SQL = "COALESCE(EXCLUDED.description, p.description)"
+MERGED_PRICE_SQL = "COALESCE(EXCLUDED.price, p.price)"
+
+# In delta mode a conflicting row is only rewritten when the hash of its merged
+# values differs from products.content_hash
+DELTA_WHERE_SQL = "WHERE p.content_hash IS DISTINCT FROM " + CONTENT_HASH_SQL.format(
+    name=MERGED_NAME_SQL, description=MERGED_DESCRIPTION_SQL, price=MERGED_PRICE_SQL
+)
+
+# Rows are collapsed to one per SKU before the merge, since ON CONFLICT cannot
+# touch the same target row twice in one statement. Folding by file position
+# reproduces the row-by-row path: the first spelling of a SKU is kept, and the
+# last non-empty name and last non-null description and price win, falling
+# back to the stored value when no row supplies one. Rows skipped by the delta condition
+# are not returned, so they are counted as unchanged.
+MERGE_SQL = f"""
+    WITH folded AS (
+        SELECT (array_agg(s.sku ORDER BY s.position))[1] AS sku,
+               (array_agg(s.name ORDER BY s.position DESC) FILTER (WHERE s.name <> ''))[1] AS name,
+               (array_agg(s.description ORDER BY s.position DESC) FILTER (WHERE s.description IS NOT NULL))[1] AS description,
+               (array_agg(s.price ORDER BY s.position DESC) FILTER (WHERE s.price IS NOT NULL))[1] AS price
+        FROM {{source}} s
+        {{where}}
+        GROUP BY s.sku
+    ), merged AS (
+        INSERT INTO products AS p (sku, name, description, price, active, created_at, updated_at)
+        SELECT sku, COALESCE(name, ''), description, price, TRUE, :now, :now
+        FROM folded
+        ON CONFLICT (sku) DO UPDATE SET
+            name = {MERGED_NAME_SQL},
+            description = {MERGED_DESCRIPTION_SQL},
+            price = {MERGED_PRICE_SQL},
+            updated_at = EXCLUDED.updated_at
+        {{delta}}
+        RETURNING (p.xmax = 0) AS inserted
+    )
+    SELECT COUNT(*) FILTER (WHERE inserted),
+           COUNT(*) FILTER (WHERE NOT inserted),
+           (SELECT COUNT(*) FROM folded) - COUNT(*)
+    FROM merged
+"""
+
+
+class StageTimer:
+    """
+    Accumulate wall time per ingestion stage of one task
+
+    Stages: 'parse' (reading and parsing chunks), 'validate' (validation and
+    normalization), 'lookup' (loading existing products in orm mode; bulk mode
+    matches them inside the merge statement), 'write' (upserts or staging),
+    'commit' (checkpoint commits, which include the ORM flush in orm mode, and
+    progress) and 'merge' (merging the staged ranges of a parallel upload).
+    Time spent in a nested stage is not counted in the enclosing one.
+
+    Each timed step is also observed in the ingest_stage_seconds histogram
+    when a MetricsBatch is given.
+    """
+
+    def __init__(self, metrics=None, labels=None, totals=None):
+        self.totals = dict(totals or {})
+        self.metrics = metrics
+        self.labels = labels or {}
+        self._nested = []
+
+    def add(self, stage, seconds):
+        self.totals[stage] = self.totals.get(stage, 0.0) + seconds
+        if self.metrics is not None:
+            self.metrics.observe('ingest_stage_seconds', seconds, {'stage': stage, **self.labels})
+
+    @contextmanager
+    def stage(self, name):
+        """Time the enclosed block as part of a stage"""
+        self._nested.append(0.0)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            nested = self._nested.pop()
+            if self._nested:
+                self._nested[-1] += elapsed
+            self.add(name, elapsed - nested)
+
+    def iterate(self, name, iterable):
+        """Yield from an iterable, timing each step as part of a stage"""
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add(name, time.perf_counter() - start)
+                return
+            self.add(name, time.perf_counter() - start)
+            yield item
+
+    def as_dict(self):
+        """Stage totals in seconds, rounded for task results and UploadJob.stage_seconds"""
+        return {stage: round(seconds, 4) for stage, seconds in self.totals.items()}
+
+
+def resolve_csv_parser(parser):
+    """Return the CSV parser to use, falling back to pandas without pyarrow"""
+    if parser == 'pyarrow' and pyarrow is None:
+        print("[Ingest] pyarrow is not installed, falling back to the pandas CSV parser")
+        return 'pandas'
+    return parser
+
+
+def csv_compression(filename):
+    """
+    Compression of an upload from its extension
+
+    Returns:
+        None for plain CSV, 'gzip' or 'zstd'
+
+    Raises:
+        ValueError: If the extension is not a supported CSV extension
+    """
+    lowered = filename.lower()
+    for extension, compression in sorted(CSV_EXTENSIONS.items(), key=lambda item: -len(item[0])):
+        if lowered.endswith(extension):
+            if compression == 'zstd' and zstandard is None:
+                raise ValueError("Zstandard uploads need the zstandard package (pip install zstandard)")
+            return compression
+    raise ValueError(f"Unsupported file type: {filename}")
+
+
+@contextmanager
+def open_csv_source(file_path):
+    """
+    Open an uploaded CSV for reading, decompressing on the fly
+
+    Compressed files are decompressed as they are read, never extracted. Byte
+    offsets seen by iter_csv_chunks are positions in the decompressed stream;
+    the raw file position tells how much of the upload has been consumed.
+
+    Yields:
+        Tuple of (fh, raw): the decompressed binary stream and the underlying file
+    """
+    compression = csv_compression(file_path)
+    with open(file_path, 'rb') as raw:
+        if compression == 'gzip':
+            with gzip.GzipFile(fileobj=raw) as fh:
+                yield fh, raw
+        elif compression == 'zstd':
+            reader = zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True)
+            with io.BufferedReader(reader) as fh:
+                yield fh, raw
+        else:
+            yield raw, raw
+
+
+def file_checksum(file_path):
+    """SHA-256 of a file's bytes as stored, read in blocks"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as fh:
+        for block in iter(lambda: fh.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class QuoteTracker:
+    """
+    Track whether a CSV byte stream is inside a quoted field
+
+    As RFC 4180 (and the pandas and pyarrow parsers) define it, a quote only
+    opens a quoted field when it is the first byte of the field; one in the
+    middle of an unquoted field, like the inch mark in 'TV 55" screen', is
+    data. Inside a quoted field a doubled quote is an escaped quote. Bytes can
+    be fed in lines or in blocks of any size.
+    """
+
+    def __init__(self, delimiter=b','):
+        self.delimiter = delimiter
+        self.in_quotes = False
+        # The next byte starts a field (outside quotes)
+        self.field_start = True
+        # A quoted field ended on a quote that may be the first half of ""
+        self.pending_quote = False
+
+    def feed(self, data):
+        """
+        Advance over a block of bytes
+
+        Returns:
+            True if the block ends inside a quoted field
+        """
+        if not data:
+            return self.in_quotes
+
+        i = 0
+        if self.pending_quote:
+            self.pending_quote = False
+            if data[:1] == b'"':
+                i = 1
+            else:
+                self.in_quotes = False
+                self.field_start = False
+
+        n = len(data)
+        while True:
+            j = data.find(b'"', i)
+            if j < 0:
+                break
+
+            if self.in_quotes:
+                if j + 1 == n:
+                    # Undecided until the next byte; stay inside quotes for now
+                    self.pending_quote = True
+                    return True
+                if data[j + 1:j + 2] == b'"':
+                    i = j + 2
+                    continue
+                self.in_quotes = False
+                self.field_start = False
+            else:
+                at_start = self.field_start if j == i else data[j - 1:j] in (self.delimiter, b'\n')
+                if at_start:
+                    self.in_quotes = True
+                self.field_start = False
+            i = j + 1
+
+        if not self.in_quotes and i < n:
+            self.field_start = data[n - 1:n] in (self.delimiter, b'\n')
+        return self.in_quotes
+
+
+def skip_to(fh, offset):
+    """Move a stream forward to a byte offset, reading through it if it cannot seek"""
+    if fh.seekable():
+        fh.seek(offset)
+        return
+    while fh.tell() < offset:
+        if not fh.read(min(1024 * 1024, offset - fh.tell())):
+            break
+
+
+def read_csv_block(data, parser='pandas'):
+    """
+    Parse a block of CSV bytes (header included) with every import column as text
+
+    Args:
+        data: CSV bytes starting with the header line
+        parser: 'pandas' (C engine) or 'pyarrow'
+
+    Returns:
+        DataFrame with missing cells as NaN/None
+    """
+    if parser == 'pyarrow':
+        table = pyarrow_csv.read_csv(
+            io.BytesIO(data),
+            parse_options=pyarrow_csv.ParseOptions(newlines_in_values=True),
+            convert_options=pyarrow_csv.ConvertOptions(
+                column_types={column: pyarrow.string() for column in IMPORT_COLUMNS},
+                strings_can_be_null=True
+            )
+        )
+        return table.to_pandas()
+
+    return pd.read_csv(io.BytesIO(data), dtype=str)
+
+
+def iter_csv_chunks(fh, chunk_size, start=None, end=None, parser='pandas'):
+    """
+    Read a CSV file once, yielding DataFrames of up to chunk_size records
+
+    Records are split on newlines outside quoted fields (see QuoteTracker), so
+    each chunk ends on an exact byte offset.
+
+    Args:
+        fh: CSV file opened in binary mode, or a decompressed stream
+        chunk_size: Maximum number of records per chunk
+        start: Byte offset of the first record to read (defaults to after the header)
+        end: Stop once this byte offset is reached (defaults to end of file)
+        parser: CSV parser used for each chunk, 'pandas' or 'pyarrow'
+
+    Yields:
+        Tuple of (chunk_df, offset) where offset is the byte position just
+        after the last record of the chunk
+
+    Raises:
+        ValueError: If a quoted field runs on for more than MAX_RECORD_BYTES
+    """
+    header = fh.readline()
+    if start is not None:
+        skip_to(fh, start)
+
+    lines = []
+    records = 0
+    quotes = QuoteTracker()
+    in_quotes = False
+    record_bytes = 0
+
+    while True:
+        if end is not None and not in_quotes and fh.tell() >= end:
+            line = b''
+        else:
+            line = fh.readline()
+
+        if line:
+            lines.append(line)
+            in_quotes = quotes.feed(line)
+            if not in_quotes:
+                records += 1
+                record_bytes = 0
+            else:
+                record_bytes += len(line)
+                if record_bytes > MAX_RECORD_BYTES:
+                    raise ValueError(
+                        f"Unterminated quoted field: a record before byte {fh.tell()} is longer "
+                        f"than {MAX_RECORD_BYTES} bytes"
+                    )
+
+        if (records >= chunk_size and not in_quotes) or (not line and lines):
+            chunk_df = read_csv_block(header + b''.join(lines), parser)
+            yield chunk_df, fh.tell()
+            lines = []
+            records = 0
+
+        if not line:
+            break
+
+
+def split_csv_ranges(fh, parts):
+    """
+    Split a CSV file into byte ranges that start and end on record boundaries
+
+    Quotes are tracked from the start of the file with QuoteTracker, so a split
+    point never lands inside a quoted field that spans several lines.
+
+    Args:
+        fh: CSV file opened in binary mode
+        parts: Desired number of ranges
+
+    Returns:
+        List of (start, end) byte offsets covering every record after the header
+
+    Raises:
+        ValueError: If a quoted field runs on for more than MAX_RECORD_BYTES
+    """
+    fh.seek(0, os.SEEK_END)
+    size = fh.tell()
+    fh.seek(0)
+    fh.readline()
+    data_start = fh.tell()
+
+    boundaries = [data_start]
+    quotes = QuoteTracker()
+    step = max(1, (size - data_start) // max(1, parts))
+
+    for index in range(1, parts):
+        target = data_start + index * step
+        if target <= fh.tell():
+            continue
+
+        while fh.tell() < target:
+            block = fh.read(min(1024 * 1024, target - fh.tell()))
+            if not block:
+                break
+            quotes.feed(block)
+
+        record_start = fh.tell()
+        while True:
+            line = fh.readline()
+            if not line or not quotes.feed(line):
+                break
+            if fh.tell() - record_start > MAX_RECORD_BYTES:
+                raise ValueError(
+                    f"Unterminated quoted field: a record after byte {record_start} is longer "
+                    f"than {MAX_RECORD_BYTES} bytes"
+                )
+
+        if fh.tell() < size and fh.tell() > boundaries[-1]:
+            boundaries.append(fh.tell())
+
+    boundaries.append(size)
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+
+def _copy_value(value):
+    """Encode a value for COPY ... FROM STDIN in text format"""
+    if value is None:
+        return '\\N'
+    return (str(value)
+            .replace('\\', '\\\\')
+            .replace('\t', '\\t')
+            .replace('\n', '\\n')
+            .replace('\r', '\\r'))
+
+
+def stripped_columns(chunk_df):
+    """Import columns of a chunk as stripped strings, blanks and missing columns as NA"""
+    columns = {}
+    for column in IMPORT_COLUMNS:
+        if column in chunk_df:
+            values = chunk_df[column].astype('string').str.strip()
+            columns[column] = values.mask(values == '')
+        else:
+            columns[column] = pd.Series(pd.NA, index=chunk_df.index, dtype='string')
+    return pd.DataFrame(columns)
+
+
+def round_price(value):
+    """Round a price to cents the way Postgres casts it to Numeric(10, 2), half away from zero"""
+    return Decimal(value).quantize(PRICE_STEP, rounding=ROUND_HALF_UP)
+
+
+def validate_chunk(chunk_df, start, first_row):
+    """
+    Split a chunk into valid rows and rejected rows, column-wise
+
+    A row is rejected when its SKU or name is missing, the name is longer
+    than the products column allows, or the price is not a number that fits
+    Numeric(10, 2). Every failed check is listed in the row's error.
+
+    Args:
+        chunk_df: Chunk with blank rows removed (see filter_valid_rows)
+        start: Byte offset of the chunk, used as the base for row positions
+        first_row: Number of data rows before this chunk
+
+    Returns:
+        Tuple of (valid_df, rejects) where rejects are tuples of
+        (row, position, error, sku, name, description, price)
+
+    Raises:
+        ValueError: If the CSV header lacks a required column
+    """
+    missing = [column for column in REQUIRED_COLUMNS if column not in chunk_df.columns]
+    if missing:
+        raise ValueError(f"CSV is missing required columns: {', '.join(missing)}")
+
+    frame = stripped_columns(chunk_df)
+    numeric_price = pd.to_numeric(frame['price'], errors='coerce')
+
+    # Prices are rounded to cents when written, so 99999999.995 overflows too;
+    # only prices within a cent of the limit need the exact decimal check
+    over_limit = numeric_price >= PRICE_LIMIT
+    near_limit = (numeric_price >= PRICE_LIMIT - 0.01) & ~over_limit
+    if near_limit.any():
+        over_limit[near_limit] = [round_price(value) >= PRICE_LIMIT for value in frame['price'][near_limit]]
+
+    checks = [
+        (frame['sku'].isna(), 'sku is required'),
+        (frame['name'].isna(), 'name is required'),
+        (frame['name'].str.len() > NAME_MAX_LENGTH, f'name is longer than {NAME_MAX_LENGTH} characters'),
+        (frame['price'].notna() & numeric_price.isna(), 'price is not a number'),
+        (numeric_price.notna() & ((numeric_price < 0) | over_limit), 'price is out of range'),
+    ]
+
+    errors = pd.Series('', index=frame.index, dtype=object)
+    for mask, message in checks:
+        mask = mask.fillna(False).astype(bool)
+        errors[mask] = errors[mask] + '; ' + message
+
+    rejected = errors != ''
+    if not rejected.any():
+        return chunk_df, []
+
+    rows = pd.Series(first_row + np.arange(1, len(frame) + 1), index=frame.index)
+    bad = frame[rejected].astype(object).where(frame[rejected].notna(), None)
+    rejects = list(zip(
+        rows[rejected].tolist(),
+        (start + bad.index.to_numpy()).tolist(),
+        errors[rejected].str[2:].tolist(),
+        bad['sku'].tolist(),
+        bad['name'].tolist(),
+        bad['description'].tolist(),
+        bad['price'].tolist(),
+    ))
+
+    return chunk_df[~rejected], rejects
+
+
+def stage_rejects(job_id, rejects):
+    """Record rejected rows of a chunk in upload_errors"""
+    if rejects:
+        _copy_into(ERROR_TABLE, ERROR_COLUMNS, [(job_id,) + reject for reject in rejects])
+
+
+def normalize_chunk(chunk_df, start):
+    """
+    Normalize a validated chunk column-wise into staging tuples
+
+    Cells are stripped and blanks become None. Rows sharing a SKU (compared
+    casefolded) are folded into one, last row wins per column: the first
+    spelling of the SKU is kept, along with the last non-empty name,
+    description and price, so the merge sees at most one row per product.
+
+    Args:
+        chunk_df: Chunk returned by validate_chunk
+        start: Byte offset of the chunk, used as the base for row positions
+
+    Returns:
+        List of (position, sku, name, description, price) tuples
+    """
+    frame = stripped_columns(chunk_df)
+    frame = frame[frame['sku'].notna()]
+    if frame.empty:
+        return []
+
+    frame['position'] = start + frame.index.to_numpy()
+
+    folded = frame.groupby(frame['sku'].str.casefold(), sort=False).agg(
+        position=('position', 'last'),
+        sku=('sku', 'first'),
+        name=('name', 'last'),
+        description=('description', 'last'),
+        price=('price', 'last'),
+    )
+    folded = folded.astype(object).where(folded.notna(), None)
+
+    return list(zip(
+        folded['position'].astype(int).tolist(),
+        folded['sku'].tolist(),
+        folded['name'].tolist(),
+        folded['description'].tolist(),
+        folded['price'].tolist(),
+    ))
+
+
+def copy_rows(cursor, table, columns, rows):
+    """Stream rows into a table with COPY FROM STDIN"""
+    buf = io.StringIO()
+    for row in rows:
+        buf.write('\t'.join(_copy_value(value) for value in row))
+        buf.write('\n')
+    buf.seek(0)
+    cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", buf)
+
+
+def _copy_into(table, columns, rows):
+    """COPY rows into a table over the current session connection"""
+    cursor = db.session.connection().connection.cursor()
+    try:
+        copy_rows(cursor, table, columns, rows)
+    finally:
+        cursor.close()
+
+
+def merge_staged(source, where='', params=None, delta=False):
+    """
+    Merge staged rows into products with a single INSERT ... ON CONFLICT
+
+    Args:
+        source: Staging table holding (position, sku, name, description) rows
+        where: Optional WHERE clause restricting the staged rows
+        params: Bind parameters for the WHERE clause
+        delta: Leave products whose content hash would not change untouched
+
+    Returns:
+        Tuple of (inserted, updated, unchanged) counts
+    """
+    sql = MERGE_SQL.format(source=source, where=where, delta=DELTA_WHERE_SQL if delta else '')
+    inserted, updated, unchanged = db.session.execute(text(sql), {'now': utc_now(), **(params or {})}).one()
+    return inserted, updated, unchanged
+
+
+def bulk_upsert_chunk(rows, delta=False):
+    """
+    Merge a chunk into products with COPY + INSERT ... ON CONFLICT
+
+    Runs inside the current session transaction, so the caller still decides
+    when to commit or roll back.
+
+    Args:
+        rows: Staging tuples as returned by normalize_chunk
+        delta: Only write new or changed products
+
+    Returns:
+        Tuple of (inserted, updated, unchanged) counts
+    """
+    if not rows:
+        return 0, 0, 0
+
+    db.session.execute(text(CREATE_STAGING_SQL))
+    db.session.execute(text(f"TRUNCATE {STAGING_TABLE}"))
+    _copy_into(STAGING_TABLE, STAGING_COLUMNS, rows)
+
+    return merge_staged(STAGING_TABLE, delta=delta)
+
+
+def stage_range_rows(job_id, rows):
+    """
+    Append a chunk from one byte range to the shared upload_staging table
+
+    Args:
+        job_id: ID of the UploadJob the rows belong to
+        rows: Staging tuples as returned by normalize_chunk
+    """
+    if rows:
+        _copy_into(RANGE_STAGING_TABLE, RANGE_STAGING_COLUMNS, [(job_id,) + row for row in rows])
+
+
+def merge_range_staging(job_id, delta=False):
+    """
+    Merge every range staged for a job and clear its staging rows
+
+    Positions are byte offsets into the file, so the last occurrence of a SKU
+    wins exactly as it would in a serial run.
+
+    Returns:
+        Tuple of (inserted, updated, unchanged) counts
+    """
+    counts = merge_staged(RANGE_STAGING_TABLE, 'WHERE s.job_id = :job_id', {'job_id': job_id}, delta)
+    clear_range_staging(job_id)
+    return counts
+
+
+def clear_range_staging(job_id):
+    """Delete staged rows left behind by a job"""
+    db.session.execute(text(f"DELETE FROM {RANGE_STAGING_TABLE} WHERE job_id = :job_id"), {'job_id': job_id})
+
+
+def orm_upsert_chunk(rows, delta=False, timer=None):
+    """
+    Upsert a chunk through the Product model
+
+    Existing products for the whole chunk are loaded with one IN query (CITEXT
+    makes it case-insensitive) and matched through a casefolded dict, so a
+    chunk costs a constant number of queries while ORM events still fire.
+    Products whose values would not change are never flushed, so delta mode
+    only affects how they are counted.
+
+    Args:
+        rows: Staging tuples as returned by normalize_chunk
+        delta: Count products with unchanged values as unchanged, not updated
+        timer: Optional StageTimer recording the product lookup as 'lookup'
+
+    Returns:
+        Tuple of (inserted, updated, unchanged) counts
+    """
+    if not rows:
+        return 0, 0, 0
+
+    skus = [row[1] for row in rows]
+    with timer.stage('lookup') if timer else nullcontext():
+        existing = {
+            product.sku.casefold(): product
+            for product in Product.query.filter(Product.sku.in_(skus))
+        }
+
+    new_products = []
+    unchanged = 0
+    for _, sku, name, description, price in rows:
+        product = existing.get(sku.casefold())
+        if price is not None:
+            price = round_price(price)
+
+        if product:
+            if delta and (not name or name == product.name) and (
+                    description is None or description == product.description) and (
+                    price is None or price == product.price):
+                unchanged += 1
+                continue
+            if name:
+                product.name = name
+            if description is not None:
+                product.description = description
+            if price is not None:
+                product.price = price
+        else:
+            product = Product(
+                sku=sku,
+                name=name or '',
+                description=description,
+                price=price,
+                active=True
+            )
+            existing[sku.casefold()] = product
+            new_products.append(product)
+
+    db.session.add_all(new_products)
+
+    return len(new_products), len(rows) - len(new_products) - unchanged, unchanged
@@ -0,0 +1,56 @@
+"""
+JSON provider that encodes responses with orjson when it is installed
+"""
+import re
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# orjson writes exponents as 1e16 / 1e-7 where json writes 1e+16 / 1e-07
+_EXPONENT_RE = re.compile(rb'[0-9]e[-+0-9]')
+
+if orjson is not None:
+    # Dates, dataclasses and str subclasses go through the Flask default hook,
+    # so they are encoded exactly as the standard provider encodes them
+    ORJSON_OPTIONS = (
+        orjson.OPT_SORT_KEYS
+        | orjson.OPT_APPEND_NEWLINE
+        | orjson.OPT_PASSTHROUGH_DATETIME
+        | orjson.OPT_PASSTHROUGH_DATACLASS
+        | orjson.OPT_PASSTHROUGH_SUBCLASS
+    )
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    Encode compact JSON responses with orjson
+
+    The output is byte-for-byte what the default provider produces: keys are
+    sorted, separators are compact, and any payload orjson would write
+    differently (non-ASCII text, which json escapes, or float exponents) is
+    encoded again with the standard library. Without orjson, in debug mode or
+    with compact disabled, the default provider is used unchanged.
+
+    The one exception is non-finite floats: orjson writes NaN and Infinity as
+    null, where json writes the bare NaN and Infinity tokens, which are not
+    valid JSON. Prices are Numeric and never non-finite.
+    """
+
+    def response(self, *args, **kwargs):
+        if orjson is None or self.compact is False or (self.compact is None and self._app.debug):
+            return super().response(*args, **kwargs)
+
+        obj = self._prepare_response_obj(args, kwargs)
+        try:
+            data = orjson.dumps(obj, default=self.default, option=ORJSON_OPTIONS)
+        except (orjson.JSONEncodeError, TypeError):
+            return super().response(*args, **kwargs)
+
+        if not data.isascii() or _EXPONENT_RE.search(data):
+            return super().response(*args, **kwargs)
+
+        return self._app.response_class(data, mimetype=self.mimetype)
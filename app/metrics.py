@@ -0,0 +1,192 @@
+"""
+Prometheus metrics shared by the web and worker processes
+
+Samples are aggregated in Redis, one hash per metric, so GET /metrics on any
+web process reports what every gunicorn and Celery process recorded. Requests
+and tasks accumulate samples in a MetricsBatch and write them with a single
+pipeline, at the end or every few seconds for long-running tasks.
+"""
+from flask import current_app, g, has_app_context, request
+from celery import signals
+from collections import defaultdict
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app.utils import get_redis
+import re
+import redis
+import threading
+import time
+
+
+METRICS_KEY = 'metrics:{name}'
+METRIC_PREFIX = 'bulk_upload_'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 500, 1000)
+
+# name: (type, help, histogram buckets)
+METRICS = {
+    'http_request_duration_seconds': ('histogram', 'Request latency by endpoint, method and status', LATENCY_BUCKETS),
+    'http_request_queries': ('histogram', 'SQL statements per request by endpoint', QUERY_BUCKETS),
+    'ingest_stage_seconds': ('histogram', 'Seconds per ingestion chunk spent in each stage', LATENCY_BUCKETS),
+    'ingest_rows_total': ('counter', 'Rows of completed uploads by outcome', None),
+    'task_duration_seconds': ('histogram', 'Celery task run time by task and state', LATENCY_BUCKETS),
+    'task_queries_total': ('counter', 'SQL statements run by Celery tasks', None),
+    'webhook_delivery_seconds': ('histogram', 'Webhook delivery latency by outcome', LATENCY_BUCKETS),
+    'webhook_delivery_failures_total': ('counter', 'Failed webhook delivery attempts by reason', None),
+}
+
+# Endpoints not timed: the scrape itself and long-lived progress streams
+UNTIMED_ENDPOINTS = {'main.metrics', 'main.upload_stream'}
+
+# Seconds between automatic flushes of a long-lived batch
+FLUSH_INTERVAL = 5
+
+_queries = threading.local()
+
+# Query count and start time of running tasks, by task id
+_task_starts = {}
+
+
+def format_labels(labels):
+    """Render labels as {name="value",...}, escaped as the text format requires"""
+    if not labels:
+        return ''
+    pairs = []
+    for name, value in sorted(labels.items()):
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+class MetricsBatch:
+    """Samples recorded locally and written to Redis in one pipeline"""
+
+    def __init__(self):
+        self.samples = defaultdict(float)
+        self.flushed_at = time.monotonic()
+
+    def inc(self, name, labels=None, amount=1):
+        """Increment a counter"""
+        self.samples[(name, format_labels(labels))] += amount
+        self.maybe_flush()
+
+    def observe(self, name, value, labels=None):
+        """Record a histogram observation"""
+        labels = labels or {}
+        for bound in METRICS[name][2]:
+            if value <= bound:
+                self.samples[(name, '_bucket' + format_labels({**labels, 'le': bound}))] += 1
+        self.samples[(name, '_bucket' + format_labels({**labels, 'le': '+Inf'}))] += 1
+        self.samples[(name, '_sum' + format_labels(labels))] += value
+        self.samples[(name, '_count' + format_labels(labels))] += 1
+        self.maybe_flush()
+
+    def maybe_flush(self):
+        if time.monotonic() - self.flushed_at >= FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        """Add the recorded samples to the shared totals in Redis"""
+        self.flushed_at = time.monotonic()
+        if not self.samples or not current_app.config['METRICS_ENABLED']:
+            self.samples.clear()
+            return
+
+        try:
+            pipe = get_redis().pipeline(transaction=False)
+            for (name, field), amount in self.samples.items():
+                pipe.hincrbyfloat(METRICS_KEY.format(name=name), field, amount)
+            pipe.execute()
+        except redis.RedisError as e:
+            print(f"[Metrics Error] Failed to record metrics: {str(e)}")
+        self.samples.clear()
+
+
+def _sample_order(field):
+    """Sort key keeping each series' buckets together and in bucket order"""
+    suffix, _, labels = field.partition('{')
+    le = re.search(r'le="([^"]+)"', labels)
+    series = re.sub(r',?le="[^"]+"', '', labels)
+    return series, suffix != '_bucket', float(le.group(1)) if le else 0.0
+
+
+def render_metrics():
+    """Return every metric in the Prometheus text exposition format"""
+    pipe = get_redis().pipeline(transaction=False)
+    for name in METRICS:
+        pipe.hgetall(METRICS_KEY.format(name=name))
+    values = pipe.execute()
+
+    lines = []
+    for (name, (kind, description, _)), samples in zip(METRICS.items(), values):
+        metric = METRIC_PREFIX + name
+        lines.append(f'# HELP {metric} {description}')
+        lines.append(f'# TYPE {metric} {kind}')
+        for field in sorted(samples, key=_sample_order):
+            lines.append(f'{metric}{field} {samples[field]}')
+    return '\n'.join(lines) + '\n'
+
+
+def count_query(*args, **kwargs):
+    _queries.count = getattr(_queries, 'count', 0) + 1
+
+
+def query_count():
+    """SQL statements executed so far by the current thread"""
+    return getattr(_queries, 'count', 0)
+
+
+def init_metrics(app):
+    """Count SQL statements and time requests of an app, unless METRICS_ENABLED is off"""
+    if not app.config['METRICS_ENABLED']:
+        return
+
+    if not event.contains(Engine, 'before_cursor_execute', count_query):
+        event.listen(Engine, 'before_cursor_execute', count_query)
+
+    @app.before_request
+    def start_request_metrics():
+        g.metrics_started = time.perf_counter()
+        g.metrics_queries = query_count()
+
+    @app.after_request
+    def record_request_metrics(response):
+        if request.endpoint in UNTIMED_ENDPOINTS or 'metrics_started' not in g:
+            return response
+
+        endpoint = request.endpoint or 'unmatched'
+        batch = MetricsBatch()
+        batch.observe('http_request_duration_seconds', time.perf_counter() - g.metrics_started, {
+            'endpoint': endpoint,
+            'method': request.method,
+            'status': response.status_code
+        })
+        batch.observe('http_request_queries', query_count() - g.metrics_queries, {'endpoint': endpoint})
+        batch.flush()
+        return response
+
+
+@signals.task_prerun.connect
+def start_task_metrics(task_id=None, **kwargs):
+    _task_starts[task_id] = (time.perf_counter(), query_count())
+
+
+@signals.task_postrun.connect
+def record_task_metrics(task_id=None, task=None, state=None, **kwargs):
+    start = _task_starts.pop(task_id, None)
+    if start is None:
+        return
+
+    started, queries = start
+    batch = MetricsBatch()
+    batch.observe('task_duration_seconds', time.perf_counter() - started, {'task': task.name, 'state': state})
+    batch.inc('task_queries_total', {'task': task.name}, query_count() - queries)
+
+    # Eager tasks run inside a request; worker tasks have left their app context
+    if has_app_context():
+        batch.flush()
+    else:
+        from app.worker import get_worker_app
+        with get_worker_app().app_context():
+            batch.flush()
@@ -7,9 +7,22 @@ def utc_now():
     return datetime.now(timezone.utc)
 
 
+# Hash of the imported fields of a product. Lengths are included so distinct
+# values never concatenate to the same text, and NULLs hash differently from ''.
+CONTENT_HASH_SQL = (
+    "md5(length({name})::text || ':' || {name} || ':' || "
+    "COALESCE(length({description})::text || ':' || {description}, '-') || ':' || "
+    "COALESCE({price}::text, '-'))"
+)
+
+
 class Product(db.Model):
     """Product model for storing product information"""
     __tablename__ = 'products'
+    __table_args__ = (
+        # Keyset pagination on (created_at, id), scanned backwards for newest first
+        db.Index('ix_products_created_at_id', 'created_at', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     sku = db.Column(CITEXT(), unique=True, nullable=False, index=True)
@@ -17,24 +30,47 @@ class Product(db.Model):
     description = db.Column(db.Text)
     price = db.Column(db.Numeric(10, 2))
     active = db.Column(db.Boolean, default=True, nullable=False)
+    # Maintained by Postgres on every write; delta uploads compare it to skip unchanged rows
+    content_hash = db.Column(
+        db.String(32),
+        db.Computed(CONTENT_HASH_SQL.format(name='name', description='description', price='price'), persisted=True)
+    )
     created_at = db.Column(db.DateTime, default=utc_now(), nullable=False)
     updated_at = db.Column(db.DateTime, default=utc_now(), onupdate=utc_now(), nullable=False)
 
     def __repr__(self):
         return f'<Product {self.sku}: {self.name}>'
 
+    # Fields exposed by the API, in to_dict order
+    FIELDS = ['id', 'sku', 'name', 'description', 'price', 'active', 'created_at', 'updated_at']
+
+    @classmethod
+    def columns(cls, fields=None):
+        """Column attributes for a list of fields, for row-tuple queries"""
+        return [getattr(cls, field) for field in (fields or cls.FIELDS)]
+
+    @classmethod
+    def row_to_dict(cls, row, fields=None):
+        """
+        Convert a product or a row tuple to the to_dict representation
+
+        Args:
+            row: Product instance or row selected with Product.columns(fields)
+            fields: Fields to include (defaults to all)
+        """
+        data = {}
+        for field in fields or cls.FIELDS:
+            value = getattr(row, field)
+            if field == 'price':
+                value = float(value) if value else None
+            elif field in ('created_at', 'updated_at'):
+                value = value.isoformat()
+            data[field] = value
+        return data
+
     def to_dict(self):
         """Convert product to dictionary"""
-        return {
-            'id': self.id,
-            'sku': self.sku,
-            'name': self.name,
-            'description': self.description,
-            'price': float(self.price) if self.price else None,
-            'active': self.active,
-            'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat()
-        }
+        return Product.row_to_dict(self)
 
 
 class Webhook(db.Model):
@@ -45,6 +81,10 @@ class Webhook(db.Model):
     url = db.Column(db.String(500), nullable=False)
     event_type = db.Column(db.String(50), nullable=False)
     enabled = db.Column(db.Boolean, default=True, nullable=False)
+    batch_enabled = db.Column(db.Boolean, default=False, nullable=False)
+    batch_window = db.Column(db.Integer, default=10, nullable=False)  # seconds
+    batch_max_events = db.Column(db.Integer, default=100, nullable=False)
+    batch_gzip = db.Column(db.Boolean, default=False, nullable=False)
     created_at = db.Column(db.DateTime, default=utc_now(), nullable=False)
     updated_at = db.Column(db.DateTime, default=utc_now(), onupdate=utc_now(), nullable=False)
 
@@ -58,20 +98,82 @@ class Webhook(db.Model):
             'url': self.url,
             'event_type': self.event_type,
             'enabled': self.enabled,
+            'batch_enabled': self.batch_enabled,
+            'batch_window': self.batch_window,
+            'batch_max_events': self.batch_max_events,
+            'batch_gzip': self.batch_gzip,
             'created_at': self.created_at.isoformat(),
             'updated_at': self.updated_at.isoformat()
         }
 
 
+class WebhookDelivery(db.Model):
+    """Webhook delivery log, one row per HTTP attempt"""
+    __tablename__ = 'webhook_deliveries'
+
+    id = db.Column(db.Integer, primary_key=True)
+    webhook_id = db.Column(db.Integer, db.ForeignKey('webhooks.id', ondelete='CASCADE'), nullable=False, index=True)
+    event_type = db.Column(db.String(50), nullable=False)
+    url = db.Column(db.String(500), nullable=False)
+    attempt = db.Column(db.Integer, default=1, nullable=False)
+    status = db.Column(db.String(20), nullable=False)
+    status_code = db.Column(db.Integer)
+    response_time = db.Column(db.Float)
+    error_message = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=utc_now, nullable=False, index=True)
+
+    def __repr__(self):
+        return f'<WebhookDelivery {self.webhook_id} #{self.attempt}: {self.status}>'
+
+    def to_dict(self):
+        """Convert webhook delivery to dictionary"""
+        return {
+            'id': self.id,
+            'webhook_id': self.webhook_id,
+            'event_type': self.event_type,
+            'url': self.url,
+            'attempt': self.attempt,
+            'status': self.status,
+            'status_code': self.status_code,
+            'response_time': self.response_time,
+            'error_message': self.error_message,
+            'created_at': self.created_at.isoformat()
+        }
+
+
 class UploadJob(db.Model):
     """Upload job model for tracking CSV upload progress"""
     __tablename__ = 'upload_jobs'
 
     id = db.Column(db.Integer, primary_key=True)
     task_id = db.Column(db.String(255), unique=True, nullable=False)
+    # 'upload' for CSV imports, 'bulk_delete' for background product deletes
+    job_type = db.Column(db.String(50), default='upload', nullable=False)
     filename = db.Column(db.String(255), nullable=False)
+    file_path = db.Column(db.String(1024))
     total_rows = db.Column(db.Integer, default=0)
     processed_rows = db.Column(db.Integer, default=0)
+    inserted_rows = db.Column(db.Integer, default=0)
+    updated_rows = db.Column(db.Integer, default=0)
+    unchanged_rows = db.Column(db.Integer, default=0)
+    # Rows quarantined by validation, listed in upload_errors
+    rejected_rows = db.Column(db.Integer, default=0)
+    # SHA-256 of the uploaded file, to recognize a file that was already imported
+    file_checksum = db.Column(db.String(64), index=True)
+    # Catalog version after the job's last write; a repeated file is only skipped
+    # while no other write has bumped it since
+    catalog_version = db.Column(db.BigInteger)
+    file_size = db.Column(db.BigInteger, default=0)
+    # Bytes stored so far by a chunked upload session (status 'receiving')
+    bytes_received = db.Column(db.BigInteger, default=0)
+    bytes_processed = db.Column(db.BigInteger, default=0)
+    checkpoint_offset = db.Column(db.BigInteger, default=0)
+    checkpoint_chunk = db.Column(db.Integer, default=0)
+    # process_csv_upload options the upload was queued with (mode, delta, max_errors, profile),
+    # passed again when it is resumed
+    options = db.Column(db.JSON)
+    # Seconds spent in each ingestion stage (parse, validate, lookup, write, commit, merge)
+    stage_seconds = db.Column(db.JSON)
     status = db.Column(db.String(50), default='pending')
     error_message = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=utc_now(), nullable=False)
@@ -80,18 +182,77 @@ class UploadJob(db.Model):
     def __repr__(self):
         return f'<UploadJob {self.task_id}: {self.status}>'
 
+    def byte_progress(self):
+        """Progress of the job by bytes consumed, as reported to the UI"""
+        percent = int(self.bytes_processed / self.file_size * 100) if self.file_size else 0
+        return {
+            'current': self.processed_rows,
+            'total': self.total_rows,
+            'percent': percent,
+            'bytes_read': self.bytes_processed,
+            'bytes_total': self.file_size
+        }
+
     def to_dict(self):
         """Convert upload job to dictionary"""
         progress = (self.processed_rows / self.total_rows * 100) if self.total_rows > 0 else 0
         return {
             'id': self.id,
             'task_id': self.task_id,
+            'job_type': self.job_type,
             'filename': self.filename,
             'total_rows': self.total_rows,
             'processed_rows': self.processed_rows,
+            'inserted_rows': self.inserted_rows,
+            'updated_rows': self.updated_rows,
+            'unchanged_rows': self.unchanged_rows,
+            'rejected_rows': self.rejected_rows,
+            'file_checksum': self.file_checksum,
+            'catalog_version': self.catalog_version,
+            'file_size': self.file_size,
+            'bytes_received': self.bytes_received,
+            'bytes_processed': self.bytes_processed,
+            'checkpoint_offset': self.checkpoint_offset,
+            'checkpoint_chunk': self.checkpoint_chunk,
+            'stage_seconds': self.stage_seconds,
             'progress': round(progress, 2),
             'status': self.status,
             'error_message': self.error_message,
             'created_at': self.created_at.isoformat(),
             'updated_at': self.updated_at.isoformat()
         }
+
+
+# Shared staging area for parallel CSV ingestion; every byte range of a file
+# appends here and the finalizer merges the job's rows in one statement
+upload_staging = db.Table(
+    'upload_staging',
+    db.Column('job_id', db.Integer, nullable=False, index=True),
+    db.Column('position', db.BigInteger, nullable=False),
+    db.Column('sku', CITEXT(), nullable=False),
+    db.Column('name', db.Text),
+    db.Column('description', db.Text),
+    db.Column('price', db.Numeric(10, 2)),
+    prefixes=['UNLOGGED']
+)
+
+
+class UploadError(db.Model):
+    """A CSV row rejected by validation, kept for the job's errors file"""
+    __tablename__ = 'upload_errors'
+
+    id = db.Column(db.BigInteger, primary_key=True)
+    job_id = db.Column(db.Integer, db.ForeignKey('upload_jobs.id', ondelete='CASCADE'), nullable=False, index=True)
+    # 1-based data row number, not counting blank rows
+    row = db.Column(db.BigInteger, nullable=False)
+    # Byte offset based position, used to renumber rows of parallel ranges
+    position = db.Column(db.BigInteger, nullable=False)
+    error = db.Column(db.Text, nullable=False)
+    sku = db.Column(db.Text)
+    name = db.Column(db.Text)
+    description = db.Column(db.Text)
+    price = db.Column(db.Text)
+
+    def __repr__(self):
+        return f'<UploadError {self.job_id} row {self.row}: {self.error}>'
+
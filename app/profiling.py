@@ -0,0 +1,274 @@
+"""
+On-demand profiling of requests and upload tasks
+
+With PROFILING_ENABLED on, a request carrying a valid profile token (the
+X-Profile-Token header or a ?profile=<token> query parameter) runs under
+cProfile, and so does process_csv_upload when queued with profile=True.
+Each run stores <id>.prof (pstats data including callers) and <id>.json (top
+functions and a per-statement SQL summary) in PROFILE_FOLDER, served as JSON,
+text or pstats by the profile endpoints. Request profiles are named by a
+random request id returned in X-Profile-Id, upload profiles by job-<job_id>.
+
+cProfile can only run one profile per process (on Python 3.12+ it hooks the
+process-wide sys.monitoring), so a request or job starting while another
+profile runs in the same process is executed without being profiled. On
+3.12+ a profile also records calls made meanwhile by other threads.
+
+With profiling disabled no hooks are installed.
+"""
+from flask import current_app, g, request
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+import cProfile
+import io
+import json
+import os
+import pstats
+import re
+import threading
+import time
+import uuid
+
+
+PROFILE_TOKEN_HEADER = 'X-Profile-Token'
+PROFILE_ID_HEADER = 'X-Profile-Id'
+PROFILE_ID_PATTERN = re.compile(r'^[A-Za-z0-9-]+$')
+
+# Entries kept in the JSON summary
+TOP_FUNCTIONS = 40
+TOP_STATEMENTS = 50
+STATEMENT_LENGTH = 300
+
+# Downloading a profile is not profiled itself
+UNPROFILED_ENDPOINTS = {'main.get_profile', 'main.get_upload_profile'}
+
+# The profile running in this process and the thread it belongs to, guarded by _lock
+_active = {'profile': None, 'thread': None}
+_lock = threading.Lock()
+
+
+def token_serializer():
+    return URLSafeTimedSerializer(current_app.config['SECRET_KEY'], salt='profile')
+
+
+def create_profile_token():
+    """Return a signed token that enables profiling until PROFILE_TOKEN_MAX_AGE passes"""
+    return token_serializer().dumps({'scope': 'profile'})
+
+
+def valid_profile_token(token):
+    """Check a profile token's signature and age"""
+    if not token:
+        return False
+    try:
+        data = token_serializer().loads(token, max_age=current_app.config['PROFILE_TOKEN_MAX_AGE'])
+    except BadSignature:
+        return False
+    return data.get('scope') == 'profile'
+
+
+def request_profile_token():
+    """Profile token sent with the current request, if any"""
+    return request.headers.get(PROFILE_TOKEN_HEADER) or request.args.get('profile')
+
+
+def profile_path(profile_id, extension):
+    """Path of a profile artifact, or None for an invalid id"""
+    if not PROFILE_ID_PATTERN.match(profile_id or ''):
+        return None
+    return os.path.join(current_app.config['PROFILE_FOLDER'], f'{profile_id}.{extension}')
+
+
+def normalize_statement(statement):
+    """Collapse whitespace so executions of one statement are grouped together"""
+    return ' '.join(statement.split())[:STATEMENT_LENGTH]
+
+
+def current_profile():
+    """SQL timings of the profile running on this thread, if any"""
+    if _active['thread'] != threading.get_ident():
+        return None
+    return _active['profile']
+
+
+def before_execute(conn, cursor, statement, parameters, context, executemany):
+    if current_profile() is not None:
+        context._profile_started = time.perf_counter()
+
+
+def after_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = current_profile()
+    started = getattr(context, '_profile_started', None)
+    if profile is not None and started is not None:
+        entry = profile['sql'][normalize_statement(statement)]
+        entry[0] += 1
+        entry[1] += time.perf_counter() - started
+
+
+def summarize(profiler, sql, profile_id, kind, target, started_at, duration):
+    """Build the JSON summary of a finished profile"""
+    stats = pstats.Stats(profiler)
+    functions = []
+    for (filename, line, name), (_, calls, total, cumulative, _) in stats.stats.items():
+        functions.append({
+            'function': f'{filename}:{line}({name})',
+            'calls': calls,
+            'total_seconds': round(total, 6),
+            'cumulative_seconds': round(cumulative, 6)
+        })
+    functions.sort(key=lambda function: function['cumulative_seconds'], reverse=True)
+
+    statements = [
+        {'statement': statement, 'count': count, 'total_seconds': round(seconds, 6)}
+        for statement, (count, seconds) in sql.items()
+    ]
+    statements.sort(key=lambda statement: statement['total_seconds'], reverse=True)
+
+    return {
+        'id': profile_id,
+        'kind': kind,
+        'target': target,
+        'started_at': started_at,
+        'duration_seconds': round(duration, 6),
+        'top_functions': functions[:TOP_FUNCTIONS],
+        'sql': statements[:TOP_STATEMENTS],
+        'sql_total': {
+            'count': sum(statement['count'] for statement in statements),
+            'seconds': round(sum(statement['total_seconds'] for statement in statements), 6)
+        }
+    }
+
+
+@contextmanager
+def profile_run(profile_id, kind, target):
+    """
+    Profile the enclosed block and store its artifacts
+
+    A block nested in another profiled block (an eager task inside a profiled
+    request) is covered by the outer profile and not profiled again. While
+    another thread of the process is being profiled the block runs unprofiled.
+
+    Args:
+        profile_id: Name of the artifacts, e.g. a request id or job-<job_id>
+        kind: 'request' or 'job'
+        target: What was profiled, e.g. 'GET /api/products' or an upload filename
+
+    Yields:
+        True when the block is profiled, by this or an enclosing profile
+    """
+    if current_profile() is not None:
+        yield True
+        return
+
+    if not _lock.acquire(blocking=False):
+        print(f"[Profile] Another profile is running, {kind} {profile_id} is not profiled")
+        yield False
+        return
+
+    profile = {'sql': defaultdict(lambda: [0, 0.0])}
+    profiler = cProfile.Profile()
+    started_at = datetime.now(timezone.utc).isoformat()
+    start = time.perf_counter()
+
+    _active['profile'] = profile
+    _active['thread'] = threading.get_ident()
+    try:
+        profiler.enable()
+    except ValueError as e:
+        # Another profiler (e.g. a debugger) owns the process-wide hook
+        _active['profile'] = _active['thread'] = None
+        _lock.release()
+        print(f"[Profile] {kind} {profile_id} is not profiled: {str(e)}")
+        yield False
+        return
+
+    try:
+        yield True
+    finally:
+        profiler.disable()
+        _active['profile'] = _active['thread'] = None
+        _lock.release()
+        duration = time.perf_counter() - start
+
+        try:
+            folder = current_app.config['PROFILE_FOLDER']
+            os.makedirs(folder, exist_ok=True)
+            profiler.dump_stats(profile_path(profile_id, 'prof'))
+            summary = summarize(profiler, profile['sql'], profile_id, kind, target, started_at, duration)
+            with open(profile_path(profile_id, 'json'), 'w') as fh:
+                json.dump(summary, fh, indent=2)
+            print(f"[Profile] Stored {kind} profile {profile_id} ({duration:.2f}s)")
+        except Exception as e:
+            print(f"[Profile Error] Failed to store profile {profile_id}: {str(e)}")
+
+
+def load_profile(profile_id, fmt='json'):
+    """
+    Return a stored profile as (body, mimetype), or None when it does not exist
+
+    Args:
+        profile_id: Request id or job-<job_id>
+        fmt: 'json' (summary), 'text' (pstats report with callers) or 'pstats' (raw data)
+    """
+    prof_path = profile_path(profile_id, 'prof')
+    if not prof_path or not os.path.exists(prof_path):
+        return None
+
+    if fmt == 'pstats':
+        with open(prof_path, 'rb') as fh:
+            return fh.read(), 'application/octet-stream'
+
+    if fmt == 'text':
+        out = io.StringIO()
+        stats = pstats.Stats(prof_path, stream=out)
+        stats.sort_stats('cumulative').print_stats(TOP_FUNCTIONS)
+        stats.print_callers(TOP_FUNCTIONS)
+        return out.getvalue(), 'text/plain'
+
+    with open(profile_path(profile_id, 'json')) as fh:
+        return fh.read(), 'application/json'
+
+
+def init_profiling(app):
+    """Install the request and SQL hooks of an app, unless PROFILING_ENABLED is off"""
+    if not app.config['PROFILING_ENABLED']:
+        return
+
+    if not event.contains(Engine, 'before_cursor_execute', before_execute):
+        event.listen(Engine, 'before_cursor_execute', before_execute)
+        event.listen(Engine, 'after_cursor_execute', after_execute)
+
+    @app.before_request
+    def start_request_profile():
+        token = request_profile_token()
+        if not token or request.endpoint in UNPROFILED_ENDPOINTS or not valid_profile_token(token):
+            return
+
+        profile_id = uuid.uuid4().hex
+        run = profile_run(profile_id, 'request', f'{request.method} {request.path}')
+        if run.__enter__():
+            g.profile_id = profile_id
+            g.profile_run = run
+        else:
+            run.__exit__(None, None, None)
+
+    @app.after_request
+    def add_profile_header(response):
+        if 'profile_id' in g:
+            response.headers[PROFILE_ID_HEADER] = g.profile_id
+        return response
+
+    @app.teardown_request
+    def finish_request_profile(exc=None):
+        run = g.pop('profile_run', None)
+        if run is not None:
+            run.__exit__(None, None, None)
+
+    @app.cli.command('profile-token')
+    def profile_token_command():
+        """Print a profile token for X-Profile-Token or ?profile="""
+        print(create_profile_token())
@@ -1,5 +1,7 @@
-from flask import render_template
+from flask import Response, abort, current_app, render_template
 from app.routes import main_bp
+from app.metrics import render_metrics
+import redis
 
 
 @main_bp.route('/')
@@ -24,3 +26,17 @@ def webhooks_page():
 def upload_page():
     """Upload page"""
     return render_template('upload.html')
+
+
+@main_bp.route('/metrics')
+def metrics():
+    """Prometheus metrics of every web and worker process"""
+    if not current_app.config['METRICS_ENABLED']:
+        abort(404)
+
+    try:
+        body = render_metrics()
+    except redis.RedisError as e:
+        return Response(f'Metrics unavailable: {str(e)}\n', status=503, mimetype='text/plain')
+
+    return Response(body, mimetype='text/plain; version=0.0.4')
@@ -1,18 +1,101 @@
-from flask import request, jsonify
+from flask import Response, abort, current_app, request, jsonify, stream_with_context
 from app.routes import product_bp
 from app import db
-from app.models import Product
-from app.utils import trigger_webhook
-from sqlalchemy import or_
+from app.models import Product, UploadJob, utc_now
+from app.ingest import IMPORT_COLUMNS
+from app.tasks import delete_products
+from app.utils import bump_catalog_version, catalog_cached, get_enabled_webhooks, trigger_webhook
+from celery.utils import uuid
+from datetime import datetime
+from sqlalchemy import Text, cast, func, or_, select, tuple_
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.sql import text
+import base64
+import csv
+import io
+import json
+import math
+import zlib
+
+
+TOTAL_MODES = ['exact', 'estimate', 'none']
+
+# Text search configuration used for description search and its index
+SEARCH_CONFIG = 'simple'
+
+EXPORT_FORMATS = ['csv', 'ndjson']
+EXPORT_MIMETYPES = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+# Rows fetched per round trip from the server-side cursor during exports
+EXPORT_BATCH_SIZE = 5000
+
+BATCH_OPS = ['upsert', 'delete']
+NDJSON_MIMETYPES = ['application/x-ndjson', 'application/jsonl', 'application/ndjson']
+
+# Largest value of the products.id INTEGER column
+MAX_PRODUCT_ID = 2 ** 31 - 1
+
+# SQLSTATE raised when lock_timeout expires
+LOCK_NOT_AVAILABLE = '55P03'
+
+# Set-based statements for POST /api/products/batch. Items are passed as
+# parallel arrays and expanded with unnest, so each statement is one round trip
+# however large the batch is.
+BATCH_UPDATE_SQL = """
+    UPDATE products AS p SET
+        name = COALESCE(i.name, p.name),
+        description = CASE WHEN i.has_description THEN i.description ELSE p.description END,
+        active = COALESCE(i.active, p.active),
+        updated_at = :now
+    FROM unnest(
+        CAST(:skus AS text[]), CAST(:names AS text[]), CAST(:descriptions AS text[]),
+        CAST(:has_descriptions AS boolean[]), CAST(:actives AS boolean[])
+    ) AS i(sku, name, description, has_description, active)
+    WHERE p.sku = CAST(i.sku AS citext)
+"""
+
+BATCH_INSERT_SQL = """
+    INSERT INTO products (sku, name, description, active, created_at, updated_at)
+    SELECT i.sku, i.name, i.description, i.active, :now, :now
+    FROM unnest(
+        CAST(:skus AS text[]), CAST(:names AS text[]), CAST(:descriptions AS text[]),
+        CAST(:actives AS boolean[])
+    ) AS i(sku, name, description, active)
+"""
+
+BATCH_DELETE_SQL = """
+    DELETE FROM products WHERE sku = ANY(CAST(:skus AS citext[]))
+"""
+
+
+def description_document():
+    """tsvector of the description; matches the ix_products_description_tsv index"""
+    return func.to_tsvector(SEARCH_CONFIG, func.coalesce(Product.description, ''))
+
+
+def search_query(search):
+    """tsquery for a free-text search term"""
+    return func.plainto_tsquery(SEARCH_CONFIG, search.strip())
+
+
+def search_rank(search):
+    """
+    Relevance of a product for a search term
+
+    Trigram similarity of SKU and name plus the full-text rank of the
+    description, so exact SKU hits sort first.
+    """
+    term = search.strip()
+    return (
+        func.greatest(func.similarity(cast(Product.sku, Text), term), func.similarity(Product.name, term))
+        + func.ts_rank(description_document(), search_query(search))
+    )
 
 
-@product_bp.route('', methods=['GET'])
-def get_products():
-    """Get all products with pagination and filtering"""
-    page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 20, type=int)
-    search = request.args.get('search', '')
-    active_only = request.args.get('active_only', 'false').lower() == 'true'
+def filtered_products_query(args):
+    """Build the filtered product query shared by the listing endpoints"""
+    search = args.get('search', '')
+    active_only = args.get('active_only', 'false').lower() == 'true'
 
     query = Product.query
 
@@ -26,33 +109,430 @@ def get_products():
         else:
             query = query.filter(
                 or_(
-                    Product.sku.ilike(search_filter),
+                    cast(Product.sku, Text).ilike(search_filter),
                     Product.name.ilike(search_filter),
-                    Product.description.ilike(search_filter)
+                    description_document().op('@@')(search_query(search))
                 )
             )
 
     if active_only:
         query = query.filter(Product.active)
 
-    pagination = query.order_by(Product.created_at.desc()).paginate(
-        page=page, per_page=per_page, error_out=False
+    return query
+
+
+def estimate_count(query):
+    """Row estimate for a query from the Postgres planner, without running it"""
+    compiled = query.statement.compile(dialect=db.engine.dialect)
+    plan = db.session.connection().exec_driver_sql(f'EXPLAIN (FORMAT JSON) {compiled}', compiled.params).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def parse_fields(args):
+    """
+    Fields requested with a sparse fields= parameter
+
+    Returns:
+        Tuple of (fields, error); fields is None when all fields are wanted
+    """
+    raw = args.get('fields', '').strip()
+    if not raw:
+        return None, None
+
+    fields = [field.strip() for field in raw.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in Product.FIELDS]
+    if unknown:
+        return None, f"Unknown fields: {', '.join(unknown)}"
+
+    # Keep the to_dict order and drop repeats
+    return [field for field in Product.FIELDS if field in fields], None
+
+
+def encode_cursor(product):
+    """Opaque keyset cursor for the (created_at, id) position of a product"""
+    raw = json.dumps([product.created_at.isoformat(), product.id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token):
+    """
+    Decode a cursor from encode_cursor into (created_at, id)
+
+    Raises:
+        ValueError: If the token is not a cursor from encode_cursor
+    """
+    padded = token + '=' * (-len(token) % 4)
+    created_at, product_id = json.loads(base64.urlsafe_b64decode(padded))
+    if not isinstance(created_at, str) or type(product_id) is not int or not 0 < product_id <= MAX_PRODUCT_ID:
+        raise ValueError('Malformed cursor')
+    return datetime.fromisoformat(created_at), product_id
+
+
+def products_have_dependents():
+    """Whether any foreign key references products, which rules out TRUNCATE"""
+    return db.session.execute(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_constraint "
+        "WHERE contype = 'f' AND confrelid = 'products'::regclass)"
+    )).scalar()
+
+
+def estimate_product_count():
+    """
+    Number of products from the planner statistics in pg_class
+
+    Falls back to an exact count when the table was never analyzed.
+
+    Returns:
+        Tuple of (count, approximate)
+    """
+    estimate = db.session.execute(text(
+        "SELECT reltuples::bigint FROM pg_class WHERE oid = 'products'::regclass"
+    )).scalar()
+    if estimate is None or estimate < 0:
+        return db.session.execute(text("SELECT COUNT(*) FROM products")).scalar(), False
+    return estimate, True
+
+
+def parse_batch_body():
+    """
+    Read the items of a batch request
+
+    Accepts a JSON array, or one JSON object per line when the request is sent
+    as NDJSON.
+
+    Returns:
+        Tuple of (items, error)
+    """
+    if request.mimetype in NDJSON_MIMETYPES:
+        items = []
+        for number, line in enumerate(request.get_data(as_text=True).splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                items.append(json.loads(line))
+            except ValueError:
+                return None, f'Invalid JSON on line {number}'
+        return items, None
+
+    items = request.get_json(silent=True)
+    if not isinstance(items, list):
+        return None, 'Request body must be a JSON array or NDJSON'
+    return items, None
+
+
+def validate_batch_item(item):
+    """
+    Validate and normalize one batch item in memory
+
+    Args:
+        item: Dict with 'op' ('upsert' by default), 'sku' and for upserts
+            optional 'name', 'description' and 'active'
+
+    Returns:
+        Tuple of (normalized item, error)
+    """
+    if not isinstance(item, dict):
+        return None, 'Item must be an object'
+
+    op = item.get('op', 'upsert')
+    if op not in BATCH_OPS:
+        return None, f"op must be one of: {', '.join(BATCH_OPS)}"
+
+    sku = item.get('sku')
+    if not isinstance(sku, str) or not sku.strip():
+        return None, 'SKU is required'
+
+    normalized = {'op': op, 'sku': sku.strip()}
+    if op == 'delete':
+        return normalized, None
+
+    name = item.get('name')
+    if name is not None:
+        if not isinstance(name, str) or not name.strip():
+            return None, 'name must be a non-empty string'
+        if len(name.strip()) > 255:
+            return None, 'name must be at most 255 characters'
+        name = name.strip()
+
+    description = item.get('description')
+    if description is not None and not isinstance(description, str):
+        return None, 'description must be a string'
+
+    active = item.get('active')
+    if active is not None and not isinstance(active, bool):
+        return None, 'active must be a boolean'
+
+    normalized.update({
+        'name': name,
+        'has_description': 'description' in item,
+        'description': description.strip() if description is not None else None,
+        'active': active
+    })
+    return normalized, None
+
+
+def apply_product_batch(items):
+    """
+    Apply validated batch items as set-based statements in the current transaction
+
+    Existing products are locked with one query, then updates, inserts and
+    deletes each run as a single statement. Upserts of new SKUs need a name.
+
+    Args:
+        items: Normalized items from validate_batch_item, one per SKU
+
+    Returns:
+        Tuple of (results, errors); nothing is written when errors is non-empty
+    """
+    skus = [item['sku'] for item in items]
+    existing = {
+        product.sku.casefold(): product
+        for product in Product.query.filter(Product.sku.in_(skus)).with_for_update()
+    }
+
+    errors = []
+    updates, inserts, deletes = [], [], []
+    for index, item in enumerate(items):
+        product = existing.get(item['sku'].casefold())
+        if item['op'] == 'delete':
+            deletes.append(item)
+        elif product is not None:
+            updates.append(item)
+        elif item['name'] is None:
+            errors.append({'index': index, 'sku': item['sku'], 'error': 'name is required to create a product'})
+        else:
+            inserts.append(item)
+
+    if errors:
+        return [], errors
+
+    deleted = {}
+    for item in deletes:
+        product = existing.get(item['sku'].casefold())
+        if product is not None:
+            deleted[item['sku'].casefold()] = product.to_dict()
+
+    now = utc_now()
+    if updates:
+        db.session.execute(text(BATCH_UPDATE_SQL), {
+            'now': now,
+            'skus': [item['sku'] for item in updates],
+            'names': [item['name'] for item in updates],
+            'descriptions': [item['description'] for item in updates],
+            'has_descriptions': [item['has_description'] for item in updates],
+            'actives': [item['active'] for item in updates]
+        })
+    if inserts:
+        db.session.execute(text(BATCH_INSERT_SQL), {
+            'now': now,
+            'skus': [item['sku'] for item in inserts],
+            'names': [item['name'] for item in inserts],
+            'descriptions': [item['description'] or '' for item in inserts],
+            'actives': [item['active'] if item['active'] is not None else True for item in inserts]
+        })
+    if deleted:
+        db.session.execute(text(BATCH_DELETE_SQL), {'skus': [item['sku'] for item in deletes]})
+
+    # Reload written products once so results use the same format as to_dict
+    db.session.expire_all()
+    written = [item['sku'] for item in updates + inserts]
+    products = {}
+    if written:
+        products = {
+            product.sku.casefold(): product.to_dict()
+            for product in Product.query.filter(Product.sku.in_(written))
+        }
+
+    results = []
+    for index, item in enumerate(items):
+        key = item['sku'].casefold()
+        result = {'index': index, 'op': item['op'], 'sku': item['sku']}
+        if item['op'] == 'delete':
+            result['status'] = 'deleted' if key in deleted else 'not_found'
+            if key in deleted:
+                result['product'] = deleted[key]
+        else:
+            result['status'] = 'updated' if key in existing else 'created'
+            result['product'] = products[key]
+        results.append(result)
+
+    return results, []
+
+
+def iter_export_rows(query, fmt):
+    """
+    Serialize products for export, one encoded block per cursor batch
+
+    Rows are read with yield_per, which streams them through a server-side
+    cursor, so memory stays constant however large the catalog is.
+
+    Args:
+        query: Filtered product query
+        fmt: 'csv' or 'ndjson'
+
+    Yields:
+        Text blocks in the requested format, the CSV header first
+    """
+    columns = [getattr(Product, column) for column in IMPORT_COLUMNS]
+    rows = query.with_entities(*columns).order_by(Product.id).yield_per(EXPORT_BATCH_SIZE)
+
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator='\n')
+    if fmt == 'csv':
+        writer.writerow(IMPORT_COLUMNS)
+
+    for count, row in enumerate(rows, start=1):
+        if fmt == 'csv':
+            writer.writerow(row)
+        else:
+            record = dict(zip(IMPORT_COLUMNS, row))
+            if record['price'] is not None:
+                record['price'] = float(record['price'])
+            buf.write(json.dumps(record))
+            buf.write('\n')
+
+        if count % EXPORT_BATCH_SIZE == 0:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+
+    if buf.tell():
+        yield buf.getvalue()
+
+
+def gzip_stream(blocks):
+    """Compress a stream of text blocks into a single gzip member"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for block in blocks:
+        data = compressor.compress(block.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+@product_bp.route('', methods=['GET'])
+@catalog_cached
+def get_products():
+    """
+    Get all products with pagination and filtering
+
+    Page mode (page/per_page) is used by the UI. Passing 'after' switches to
+    keyset pagination on (created_at, id): an empty value returns the first
+    page and each response carries the 'next' cursor. 'total' selects how the
+    total is computed: 'exact' (COUNT), 'estimate' (planner estimate) or
+    'none'; page mode defaults to exact, cursor mode to none.
+
+    'search' matches SKU and name substrings through trigram indexes and
+    description words through a full-text index. Page mode orders matches by
+    relevance; cursor mode keeps the (created_at, id) order.
+    """
+    page = request.args.get('page', 1, type=int)
+    per_page = request.args.get('per_page', 20, type=int)
+    after = request.args.get('after')
+    total_mode = request.args.get('total', 'exact' if after is None else 'none')
+
+    if total_mode not in TOTAL_MODES:
+        return jsonify({'error': f"total must be one of: {', '.join(TOTAL_MODES)}"}), 400
+
+    fields, error = parse_fields(request.args)
+    if error:
+        return jsonify({'error': error}), 400
+
+    query = filtered_products_query(request.args)
+    # Rows are selected as tuples of just the needed columns; cursors also need id and created_at
+    selected = fields or Product.FIELDS
+    row_columns = Product.columns(sorted(set(selected) | {'id', 'created_at'}, key=Product.FIELDS.index))
+    order = (Product.created_at.desc(), Product.id.desc())
+
+    total = None
+    if total_mode == 'estimate':
+        total = estimate_count(query)
+
+    if after is not None:
+        keyset = query
+        if after:
+            try:
+                created_at, product_id = decode_cursor(after)
+            except (ValueError, TypeError):
+                return jsonify({'error': 'Invalid cursor'}), 400
+            keyset = keyset.filter(tuple_(Product.created_at, Product.id) < tuple_(created_at, product_id))
+
+        products = keyset.with_entities(*row_columns).order_by(*order).limit(per_page + 1).all()
+        has_more = len(products) > per_page
+        products = products[:per_page]
+
+        if total_mode == 'exact':
+            total = query.order_by(None).count()
+
+        return jsonify({
+            'products': [Product.row_to_dict(row, selected) for row in products],
+            'next': encode_cursor(products[-1]) if has_more else None,
+            'per_page': per_page,
+            'total': total
+        })
+
+    # Searches are ranked by relevance in page mode; id keeps the order total
+    search = request.args.get('search', '').strip()
+    if search and search.lower() not in ['active', 'inactive']:
+        order = (search_rank(search).desc(),) + order
+
+    pagination = query.with_entities(*row_columns).order_by(*order).paginate(
+        page=page, per_page=per_page, error_out=False, count=(total_mode == 'exact')
     )
+    if total_mode == 'exact':
+        total = pagination.total
 
     return jsonify({
-        'products': [product.to_dict() for product in pagination.items],
-        'total': pagination.total,
+        'products': [Product.row_to_dict(row, selected) for row in pagination.items],
+        'total': total,
         'page': page,
         'per_page': per_page,
-        'pages': pagination.pages
+        'pages': math.ceil(total / per_page) if total is not None and per_page else None
     })
 
 
+@product_bp.route('/export', methods=['GET'])
+def export_products():
+    """
+    Stream the catalog as CSV or NDJSON
+
+    Columns match what the upload endpoint accepts, so an export can be
+    uploaded again as is. Supports the listing filters (search, active_only),
+    format=csv|ndjson and gzip=true.
+    """
+    fmt = request.args.get('format', 'csv').lower()
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': f"format must be one of: {', '.join(EXPORT_FORMATS)}"}), 400
+
+    compress = request.args.get('gzip', 'false').lower() == 'true'
+
+    body = iter_export_rows(filtered_products_query(request.args), fmt)
+    filename = f'products.{fmt}'
+    if compress:
+        body = gzip_stream(body)
+        filename += '.gz'
+
+    mimetype = 'application/gzip' if compress else EXPORT_MIMETYPES[fmt]
+    response = Response(stream_with_context(body), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+    return response
+
+
 @product_bp.route('/<int:product_id>', methods=['GET'])
+@catalog_cached
 def get_product(product_id):
-    """Get a single product by ID"""
-    product = Product.query.get_or_404(product_id)
-    return jsonify(product.to_dict())
+    """Get a single product by ID, optionally only some fields"""
+    fields, error = parse_fields(request.args)
+    if error:
+        return jsonify({'error': error}), 400
+
+    row = db.session.execute(select(*Product.columns(fields)).where(Product.id == product_id)).first()
+    if row is None:
+        abort(404)
+
+    return jsonify(Product.row_to_dict(row, fields))
 
 
 @product_bp.route('', methods=['POST'])
@@ -76,6 +556,7 @@ def create_product():
 
     db.session.add(product)
     db.session.commit()
+    bump_catalog_version()
 
     trigger_webhook('product.created', product.to_dict())
 
@@ -102,6 +583,7 @@ def update_product(product_id):
         product.active = data['active']
 
     db.session.commit()
+    bump_catalog_version()
 
     trigger_webhook('product.updated', product.to_dict())
 
@@ -116,6 +598,7 @@ def delete_product(product_id):
 
     db.session.delete(product)
     db.session.commit()
+    bump_catalog_version()
 
     trigger_webhook('product.deleted', product_data)
 
@@ -124,13 +607,158 @@ def delete_product(product_id):
 
 @product_bp.route('/bulk-delete', methods=['DELETE'])
 def bulk_delete_products():
-    """Delete all products"""
-    count = Product.query.delete()
+    """
+    Delete all products, or those matching a filter
+
+    Without filters the table is truncated, which is instant regardless of
+    size, unless other tables reference products. The reported count is then
+    the planner's estimate, so the exclusive lock only covers the TRUNCATE.
+    The lock is waited for at most BULK_DELETE_LOCK_TIMEOUT_MS, so a long
+    export or upload does not queue every other query behind it; if it is not
+    granted in time the delete runs as a background job instead.
+
+    Filtered deletes (a JSON body with "active": false and/or "skus": [...])
+    and deletes that cannot truncate run as a background job, tracked through
+    /api/upload/status/<task_id>.
+    """
+    data = request.get_json(silent=True) or {}
+    filters = {}
+
+    if 'active' in data:
+        if not isinstance(data['active'], bool):
+            return jsonify({'error': 'active must be a boolean'}), 400
+        filters['active'] = data['active']
+
+    if 'skus' in data:
+        skus = data['skus']
+        if not isinstance(skus, list) or not skus or not all(isinstance(sku, str) and sku.strip() for sku in skus):
+            return jsonify({'error': 'skus must be a non-empty list of SKUs'}), 400
+        filters['skus'] = [sku.strip() for sku in skus]
+
+    if not filters and not products_have_dependents():
+        try:
+            lock_timeout = int(current_app.config['BULK_DELETE_LOCK_TIMEOUT_MS'])
+            db.session.execute(text(f"SET LOCAL lock_timeout = {lock_timeout}"))
+            count, approximate = estimate_product_count()
+            db.session.execute(text("TRUNCATE products"))
+            db.session.commit()
+        except OperationalError as e:
+            db.session.rollback()
+            if getattr(e.orig, 'pgcode', None) != LOCK_NOT_AVAILABLE:
+                raise
+            print("[Bulk Delete] Products table is busy, deleting in batches instead")
+            return start_bulk_delete(filters)
+
+        bump_catalog_version()
+
+        about = 'About ' if approximate else ''
+        trigger_webhook('product.bulk_delete', {
+            'count': count,
+            'approximate': approximate,
+            'message': f'{about}{count} products deleted'
+        })
+
+        return jsonify({
+            'message': f'{about}{count} products deleted successfully',
+            'count': count,
+            'approximate': approximate
+        }), 200
+
+    return start_bulk_delete(filters)
+
+
+def start_bulk_delete(filters):
+    """Queue a batched delete_products job and return its 202 response"""
+    job = UploadJob(
+        task_id=uuid(),
+        job_type='bulk_delete',
+        filename='bulk-delete',
+        status='pending'
+    )
+    db.session.add(job)
     db.session.commit()
 
-    trigger_webhook('product.bulk_delete', {
-        'count': count,
-        'message': f'{count} products deleted'
+    delete_products.apply_async(args=[job.id, filters], task_id=job.task_id)
+
+    return jsonify({
+        'message': 'Bulk delete started',
+        'task_id': job.task_id,
+        'job_id': job.id
+    }), 202
+
+
+@product_bp.route('/batch', methods=['POST'])
+def batch_products():
+    """
+    Create, update and delete many products in one transaction
+
+    The body is a JSON array or NDJSON of items such as
+    {"op": "upsert", "sku": "A-1", "name": "Widget"} or {"op": "delete", "sku": "A-1"}.
+    Every item is validated first; if any item is invalid nothing is written
+    and the errors are returned. Subscribers get a single product.batch event,
+    and subscribers of product.created, product.updated and product.deleted
+    get one event per product as if it was written on its own.
+    """
+    items, error = parse_batch_body()
+    if error:
+        return jsonify({'error': error}), 400
+
+    if not items:
+        return jsonify({'error': 'Batch is empty'}), 400
+
+    max_items = current_app.config['PRODUCT_BATCH_MAX_ITEMS']
+    if len(items) > max_items:
+        return jsonify({'error': f'Batch exceeds {max_items} items'}), 413
+
+    normalized = []
+    errors = []
+    seen = set()
+    for index, item in enumerate(items):
+        valid, error = validate_batch_item(item)
+        if error:
+            sku = item.get('sku') if isinstance(item, dict) else None
+            errors.append({'index': index, 'sku': sku, 'error': error})
+            continue
+        if valid['sku'].casefold() in seen:
+            errors.append({'index': index, 'sku': valid['sku'], 'error': 'Duplicate SKU in batch'})
+            continue
+        seen.add(valid['sku'].casefold())
+        normalized.append(valid)
+
+    if errors:
+        return jsonify({'error': 'Batch rejected', 'errors': errors}), 400
+
+    try:
+        results, errors = apply_product_batch(normalized)
+        if errors:
+            db.session.rollback()
+            return jsonify({'error': 'Batch rejected', 'errors': errors}), 400
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'error': 'Batch conflicted with a concurrent write, please retry'}), 409
+
+    bump_catalog_version()
+
+    summary = {
+        status: sum(1 for result in results if result['status'] == status)
+        for status in ['created', 'updated', 'deleted', 'not_found']
+    }
+
+    trigger_webhook('product.batch', {
+        **summary,
+        'products': [
+            {'op': result['op'], 'status': result['status'], 'product': result['product']}
+            for result in results if 'product' in result
+        ]
     })
 
-    return jsonify({'message': f'{count} products deleted successfully', 'count': count}), 200
+    for status in ['created', 'updated', 'deleted']:
+        event_type = f'product.{status}'
+        if not summary[status] or not get_enabled_webhooks(event_type):
+            continue
+        for result in results:
+            if result['status'] == status and 'product' in result:
+                trigger_webhook(event_type, result['product'])
+
+    return jsonify({**summary, 'results': results}), 200
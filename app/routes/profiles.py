@@ -0,0 +1,44 @@
+from flask import Response, current_app, jsonify, request
+from app.routes import main_bp
+from app.models import UploadJob
+from app.profiling import load_profile, request_profile_token, valid_profile_token
+
+
+PROFILE_FORMATS = ['json', 'text', 'pstats']
+
+
+def profile_response(profile_id):
+    """Serve a stored profile in the format given by ?format= (json, text or pstats)"""
+    if not current_app.config['PROFILING_ENABLED']:
+        return jsonify({'error': 'Profiling is disabled'}), 404
+
+    # Profiles expose code paths and SQL, so they need the same token as profiling
+    if not valid_profile_token(request_profile_token()):
+        return jsonify({'error': 'A valid X-Profile-Token is required'}), 403
+
+    fmt = request.args.get('format', 'json')
+    if fmt not in PROFILE_FORMATS:
+        return jsonify({'error': f"format must be one of: {', '.join(PROFILE_FORMATS)}"}), 400
+
+    stored = load_profile(profile_id, fmt)
+    if stored is None:
+        return jsonify({'error': 'Profile not found'}), 404
+
+    body, mimetype = stored
+    response = Response(body, mimetype=mimetype)
+    if fmt == 'pstats':
+        response.headers['Content-Disposition'] = f'attachment; filename={profile_id}.prof'
+    return response
+
+
+@main_bp.route('/api/profiles/<profile_id>', methods=['GET'])
+def get_profile(profile_id):
+    """Download a request profile by the id returned in X-Profile-Id"""
+    return profile_response(profile_id)
+
+
+@main_bp.route('/api/upload/<int:job_id>/profile', methods=['GET'])
+def get_upload_profile(job_id):
+    """Download the profile of an upload queued with profile=true"""
+    UploadJob.query.get_or_404(job_id)
+    return profile_response(f'job-{job_id}')
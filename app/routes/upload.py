@@ -1,18 +1,138 @@
-from flask import request, jsonify
+from flask import Response, current_app, request, jsonify, stream_with_context
+from werkzeug.exceptions import ClientDisconnected
 from werkzeug.utils import secure_filename
 from app.routes import main_bp
 from app import db
-from app.models import UploadJob
+from app.models import UploadError, UploadJob
 from app.tasks import process_csv_upload
+from app.celery_app import ingest_queue
+from app.profiling import request_profile_token, valid_profile_token
+from app.ingest import CSV_EXTENSIONS, INGEST_MODES, csv_compression
+from app.utils import UPLOAD_PROGRESS_CHANNEL, get_redis, get_upload_status
+from celery.utils import uuid
+from kombu.exceptions import ChannelError
+import csv
+import io
+import json
 import os
+import threading
+import time
 
 
-ALLOWED_EXTENSIONS = ['csv']
+ALLOWED_EXTENSIONS = list(CSV_EXTENSIONS)
+
+# Block size used when streaming request bodies to disk
+UPLOAD_BLOCK_SIZE = 1024 * 1024
+
+# Milliseconds an EventSource waits before reconnecting to a stream that ended
+STREAM_RETRY_MS = 3000
+# Seconds between keep-alive comments on an idle stream
+STREAM_KEEPALIVE = 15
+
+# Progress streams open in this process, each holding a server thread
+_streams = {'open': 0}
+_streams_lock = threading.Lock()
 
 
 def allowed_file(filename):
     """Check if file extension is allowed"""
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+    return filename.lower().endswith(tuple(ALLOWED_EXTENSIONS))
+
+
+def check_upload_filename(filename):
+    """Return an error message if a file cannot be ingested, else None"""
+    if not allowed_file(filename):
+        return f"Only {', '.join(ALLOWED_EXTENSIONS)} files are allowed"
+    try:
+        csv_compression(filename)
+    except ValueError as e:
+        return str(e)
+    return None
+
+
+def upload_path(filename):
+    """Absolute path for an uploaded file in UPLOAD_FOLDER"""
+    upload_folder = os.environ.get('UPLOAD_FOLDER', 'uploads')
+
+    if not os.path.exists(upload_folder):
+        os.makedirs(upload_folder)
+
+    return os.path.abspath(os.path.join(upload_folder, filename))
+
+
+def dispatch_upload(job):
+    """
+    Queue process_csv_upload for a job with the options stored on it
+
+    A job whose task cannot be queued is marked failed, so it can be resumed
+    once the broker is back instead of staying pending.
+    """
+    try:
+        return process_csv_upload.apply_async(
+            args=[job.file_path, job.id],
+            kwargs=job.options or {},
+            task_id=job.task_id
+        )
+    except Exception as e:
+        db.session.rollback()
+        job.status = 'failed'
+        job.error_message = f'Failed to queue the upload: {str(e)}'
+        db.session.commit()
+        raise
+
+
+def queued_uploads(queue):
+    """Number of tasks waiting in a broker queue, or None when the broker cannot be reached"""
+    from app.celery_app import celery
+
+    try:
+        with celery.connection_or_acquire() as conn:
+            return conn.default_channel.queue_declare(queue=queue, passive=True).message_count
+    except ChannelError:
+        # Queues are created with their first message; a missing one is empty
+        return 0
+    except Exception as e:
+        print(f"[Upload Error] Failed to read the length of queue {queue}: {str(e)}")
+        return None
+
+
+def admission_error(size, filename):
+    """
+    Return a 429 response when the queue an upload would join is full, else None
+
+    Args:
+        size: Expected upload size in bytes (0 when unknown)
+        filename: Name of the uploaded file
+    """
+    limit = current_app.config['UPLOAD_MAX_BACKLOG']
+    if limit <= 0:
+        return None
+
+    queue = ingest_queue(size, filename, current_app.config['INGEST_SMALL_FILE_BYTES'])
+    waiting = queued_uploads(queue)
+    if waiting is None or waiting < limit:
+        return None
+
+    retry_after = current_app.config['UPLOAD_RETRY_AFTER']
+    response = jsonify({
+        'error': f'{waiting} tasks are already waiting, retry in {retry_after} seconds',
+        'queue': queue,
+        'retry_after': retry_after
+    })
+    response.status_code = 429
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+
+def profile_error(profile):
+    """Return an error response if an upload asks for profiling without a valid token, else None"""
+    if not profile:
+        return None
+    if not current_app.config['PROFILING_ENABLED']:
+        return jsonify({'error': 'Profiling is disabled'}), 400
+    if not valid_profile_token(request_profile_token()):
+        return jsonify({'error': 'profile requires a valid X-Profile-Token'}), 403
+    return None
 
 
 @main_bp.route('/api/upload', methods=['POST'])
@@ -26,25 +146,53 @@ def upload_file():
     if file.filename == '':
         return jsonify({'error': 'No file selected'}), 400
 
-    if not allowed_file(file.filename):
-        return jsonify({'error': 'Only CSV files are allowed'}), 400
+    error = check_upload_filename(file.filename)
+    if error:
+        return jsonify({'error': error}), 400
 
-    try:
-        filename = secure_filename(file.filename)
-        upload_folder = os.environ.get('UPLOAD_FOLDER', 'uploads')
+    # Checked with the file's own name and size, so admission picks the same
+    # queue as the router; a rejected upload is never stored
+    file.seek(0, os.SEEK_END)
+    size = file.tell()
+    file.seek(0)
+    busy = admission_error(size, secure_filename(file.filename))
+    if busy:
+        return busy
 
-        if not os.path.exists(upload_folder):
-            os.makedirs(upload_folder)
+    mode = request.form.get('mode')
+    if mode and mode not in INGEST_MODES:
+        return jsonify({'error': f"mode must be one of: {', '.join(INGEST_MODES)}"}), 400
 
-        file_path = os.path.abspath(os.path.join(upload_folder, filename))
+    # Optional overrides of INGEST_DELTA and INGEST_MAX_ERRORS
+    delta = request.form.get('delta')
+    if delta is not None:
+        delta = delta.lower() == 'true'
+
+    max_errors = request.form.get('max_errors', type=int)
+
+    profile = request.form.get('profile', 'false').lower() == 'true'
+    error = profile_error(profile)
+    if error:
+        return error
+
+    try:
+        # The task id is assigned up front so the task can publish progress
+        # under it from its first chunk. It also keeps the stored file apart
+        # from other uploads of the same name, which a failed job may still need.
+        task_id = uuid()
+        filename = secure_filename(file.filename)
+        file_path = upload_path(f'{task_id}-{filename}')
         file.save(file_path)
 
         print(f"[DEBUG] File saved to: {file_path}")
         print(f"[DEBUG] File exists: {os.path.exists(file_path)}")
 
         job = UploadJob(
-            task_id='',
+            task_id=task_id,
             filename=filename,
+            file_path=file_path,
+            file_size=os.path.getsize(file_path),
+            options={'mode': mode, 'delta': delta, 'max_errors': max_errors, 'profile': profile},
             status='pending'
         )
         db.session.add(job)
@@ -52,13 +200,10 @@ def upload_file():
 
         print(f"[DEBUG] Job created with ID: {job.id}")
 
-        task = process_csv_upload.apply_async(args=[file_path, job.id])
+        task = dispatch_upload(job)
 
         print(f"[DEBUG] Task dispatched with ID: {task.id}")
 
-        job.task_id = task.id
-        db.session.commit()
-
         return jsonify({
             'message': 'File upload started',
             'task_id': task.id,
@@ -72,9 +217,263 @@ def upload_file():
         return jsonify({'error': str(e)}), 500
 
 
-@main_bp.route('/api/upload/status/<task_id>', methods=['GET'])
-def upload_status(task_id):
-    """Get upload task status"""
+@main_bp.route('/api/upload/sessions', methods=['POST'])
+def create_upload_session():
+    """
+    Start a chunked upload
+
+    The body is JSON with 'filename' and optionally 'size' (total bytes).
+    Chunks are then sent with PUT /api/upload/sessions/<job_id>?offset=N and
+    the upload is queued for processing by POST .../finalize.
+    """
+    data = request.get_json(silent=True) or {}
+    filename = secure_filename(data.get('filename') or '')
+
+    if not filename:
+        return jsonify({'error': 'filename is required'}), 400
+
+    error = check_upload_filename(filename)
+    if error:
+        return jsonify({'error': error}), 400
+
+    size = data.get('size')
+    if size is not None and (not isinstance(size, int) or size <= 0):
+        return jsonify({'error': 'size must be a positive integer'}), 400
+
+    max_size = current_app.config['MAX_CONTENT_LENGTH']
+    if size and max_size and size > max_size:
+        return jsonify({'error': f'File exceeds {max_size} bytes'}), 413
+
+    busy = admission_error(size or 0, filename)
+    if busy:
+        return busy
+
+    task_id = uuid()
+    file_path = upload_path(f'{task_id}-{filename}')
+    open(file_path, 'wb').close()
+
+    job = UploadJob(
+        task_id=task_id,
+        filename=filename,
+        file_path=file_path,
+        file_size=size or 0,
+        bytes_received=0,
+        status='receiving'
+    )
+    db.session.add(job)
+    db.session.commit()
+
+    return jsonify(upload_session_dict(job)), 201
+
+
+def upload_session_dict(job):
+    """State of a chunked upload session as returned to clients"""
+    return {
+        'job_id': job.id,
+        'task_id': job.task_id,
+        'filename': job.filename,
+        'status': job.status,
+        'offset': job.bytes_received or 0,
+        'size': job.file_size or None
+    }
+
+
+@main_bp.route('/api/upload/sessions/<int:job_id>', methods=['GET'])
+def get_upload_session(job_id):
+    """Offset a client should resume a chunked upload from"""
+    job = UploadJob.query.filter_by(id=job_id, job_type='upload').first_or_404()
+    return jsonify(upload_session_dict(job))
+
+
+@main_bp.route('/api/upload/sessions/<int:job_id>', methods=['PUT'])
+def put_upload_chunk(job_id):
+    """
+    Append a chunk to a chunked upload
+
+    The raw request body is written at ?offset=N, which must equal the bytes
+    received so far; otherwise 409 is returned with the expected offset. If the
+    connection drops mid-chunk, the bytes that arrived are kept and the client
+    continues from the offset reported by GET.
+    """
+    offset = request.args.get('offset', type=int)
+    if offset is None:
+        return jsonify({'error': 'offset is required'}), 400
+
+    # The row lock serializes concurrent chunks of the same session
+    job = UploadJob.query.filter_by(id=job_id, job_type='upload').with_for_update().first_or_404()
+
+    if job.status != 'receiving':
+        db.session.rollback()
+        return jsonify({'error': f'Upload is {job.status}, not receiving chunks'}), 409
+
+    received = job.bytes_received or 0
+    if offset != received:
+        db.session.rollback()
+        return jsonify({'error': 'Offset mismatch', 'offset': received}), 409
+
+    limit = job.file_size or current_app.config['MAX_CONTENT_LENGTH']
+    disconnected = False
+    too_large = False
+
+    with open(job.file_path, 'r+b') as fh:
+        # Drop bytes past the committed offset left by an earlier failed request
+        fh.seek(received)
+        fh.truncate()
+        try:
+            while True:
+                block = request.stream.read(UPLOAD_BLOCK_SIZE)
+                if not block:
+                    break
+                if limit and received + len(block) > limit:
+                    too_large = True
+                    break
+                fh.write(block)
+                received += len(block)
+        except ClientDisconnected:
+            disconnected = True
+
+        if too_large:
+            fh.truncate(offset)
+
+    if too_large:
+        db.session.rollback()
+        return jsonify({'error': f'Upload exceeds {limit} bytes', 'offset': offset}), 413
+
+    job.bytes_received = received
+    db.session.commit()
+
+    if disconnected:
+        return jsonify({'error': 'Connection lost during chunk', **upload_session_dict(job)}), 400
+
+    return jsonify(upload_session_dict(job))
+
+
+@main_bp.route('/api/upload/sessions/<int:job_id>/finalize', methods=['POST'])
+def finalize_upload_session(job_id):
+    """Queue a fully received chunked upload for processing"""
+    data = request.get_json(silent=True) or {}
+    mode = data.get('mode')
+    if mode and mode not in INGEST_MODES:
+        return jsonify({'error': f"mode must be one of: {', '.join(INGEST_MODES)}"}), 400
+
+    delta = data.get('delta')
+    if delta is not None and not isinstance(delta, bool):
+        return jsonify({'error': 'delta must be a boolean'}), 400
+
+    max_errors = data.get('max_errors')
+    if max_errors is not None and not isinstance(max_errors, int):
+        return jsonify({'error': 'max_errors must be an integer'}), 400
+
+    profile = data.get('profile', False)
+    if not isinstance(profile, bool):
+        return jsonify({'error': 'profile must be a boolean'}), 400
+    error = profile_error(profile)
+    if error:
+        return error
+
+    job = UploadJob.query.filter_by(id=job_id, job_type='upload').with_for_update().first_or_404()
+
+    if job.status != 'receiving':
+        db.session.rollback()
+        return jsonify({'error': f'Upload is {job.status}, not receiving chunks'}), 409
+
+    received = job.bytes_received or 0
+    if not received:
+        db.session.rollback()
+        return jsonify({'error': 'No data received'}), 400
+
+    if job.file_size and received != job.file_size:
+        db.session.rollback()
+        return jsonify({'error': 'Upload is incomplete', **upload_session_dict(job)}), 409
+
+    job.file_size = received
+    job.options = {'mode': mode, 'delta': delta, 'max_errors': max_errors, 'profile': profile}
+    job.status = 'pending'
+    db.session.commit()
+
+    try:
+        task = dispatch_upload(job)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 503
+
+    return jsonify({
+        'message': 'File upload started',
+        'task_id': task.id,
+        'job_id': job.id
+    }), 202
+
+
+@main_bp.route('/api/upload/<int:job_id>/resume', methods=['POST'])
+def resume_upload(job_id):
+    """Resume a failed or interrupted upload from its last checkpoint, with its original options"""
+    from app.celery_app import celery
+
+    job = UploadJob.query.get_or_404(job_id)
+
+    resumable = job.status in ('failed', 'interrupted')
+    if job.status == 'processing' and request.args.get('force', 'false').lower() == 'true':
+        resumable = celery.AsyncResult(job.task_id).state not in ('STARTED', 'PROGRESS', 'RETRY')
+
+    if not resumable:
+        return jsonify({'error': f'Job is {job.status} and cannot be resumed'}), 409
+
+    if not job.file_path or not os.path.exists(job.file_path):
+        return jsonify({'error': 'Uploaded file is no longer available'}), 410
+
+    job.status = 'pending'
+    job.error_message = None
+    job.task_id = uuid()
+    db.session.commit()
+
+    try:
+        task = dispatch_upload(job)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 503
+
+    return jsonify({
+        'message': 'Upload resumed',
+        'task_id': task.id,
+        'job_id': job.id,
+        'checkpoint_offset': job.checkpoint_offset,
+        'checkpoint_chunk': job.checkpoint_chunk
+    }), 202
+
+
+@main_bp.route('/api/upload/<int:job_id>/errors', methods=['GET'])
+def download_upload_errors(job_id):
+    """Download the rows rejected by an upload as CSV, with row numbers and reasons"""
+    job = UploadJob.query.get_or_404(job_id)
+
+    columns = ['row', 'error', 'sku', 'name', 'description', 'price']
+    rows = (
+        db.session.query(*[getattr(UploadError, column) for column in columns])
+        .filter(UploadError.job_id == job.id)
+        .order_by(UploadError.row)
+        .yield_per(5000)
+    )
+
+    def generate():
+        buf = io.StringIO()
+        writer = csv.writer(buf, lineterminator='\n')
+        writer.writerow(columns)
+        for count, row in enumerate(rows, start=1):
+            writer.writerow(row)
+            if count % 5000 == 0:
+                yield buf.getvalue()
+                buf.seek(0)
+                buf.truncate()
+        yield buf.getvalue()
+
+    filename = f"{os.path.splitext(job.filename)[0]}-errors.csv"
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
+
+def upload_status_from_db(task_id):
+    """Build an upload status response from Celery and the database"""
     from app.celery_app import celery
 
     task = celery.AsyncResult(task_id)
@@ -82,7 +481,7 @@ def upload_status(task_id):
     job = UploadJob.query.filter_by(task_id=task_id).first()
 
     if not job:
-        return jsonify({'error': 'Job not found'}), 404
+        return None
 
     response = {
         'task_id': task_id,
@@ -95,4 +494,95 @@ def upload_status(task_id):
     elif task.state == 'SUCCESS':
         response['result'] = task.info
 
+    # Parallel uploads finish the dispatcher task early; the byte ranges
+    # accumulate their progress on the job row instead
+    if job.status == 'processing' and task.state != 'PROGRESS':
+        response['progress'] = job.byte_progress()
+
+    return response
+
+
+@main_bp.route('/api/upload/status/<task_id>', methods=['GET'])
+def upload_status(task_id):
+    """Get upload task status, from Redis while the task is publishing it"""
+    response = get_upload_status(task_id) or upload_status_from_db(task_id)
+
+    if not response:
+        return jsonify({'error': 'Job not found'}), 404
+
     return jsonify(response)
+
+
+def open_stream_slot():
+    """Reserve one of UPLOAD_STREAM_MAX_OPEN stream slots of this process; False when all are taken"""
+    with _streams_lock:
+        if _streams['open'] >= current_app.config['UPLOAD_STREAM_MAX_OPEN']:
+            return False
+        _streams['open'] += 1
+        return True
+
+
+def close_stream_slot():
+    with _streams_lock:
+        _streams['open'] -= 1
+
+
+@main_bp.route('/api/upload/stream/<task_id>', methods=['GET'])
+def upload_stream(task_id):
+    """
+    Stream upload progress as Server-Sent Events
+
+    Each open stream holds a server thread, so a process serves at most
+    UPLOAD_STREAM_MAX_OPEN of them and answers 503 beyond that (the upload page
+    then polls the status endpoint). A stream ends after
+    UPLOAD_STREAM_MAX_SECONDS; the EventSource reconnects after STREAM_RETRY_MS
+    and starts again from the current status.
+    """
+    if not open_stream_slot():
+        response = jsonify({'error': 'Too many progress streams, poll /api/upload/status instead'})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(STREAM_RETRY_MS // 1000)
+        return response
+
+    deadline = time.monotonic() + current_app.config['UPLOAD_STREAM_MAX_SECONDS']
+
+    def is_finished(message):
+        return message['job']['status'] in ('completed', 'failed')
+
+    def generate():
+        pubsub = get_redis().pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(UPLOAD_PROGRESS_CHANNEL.format(task_id=task_id))
+        try:
+            # Subscribe before reading the snapshot so no update falls in between
+            snapshot = get_upload_status(task_id) or upload_status_from_db(task_id)
+            if not snapshot:
+                yield f"event: error\ndata: {json.dumps({'error': 'Job not found'})}\n\n"
+                return
+
+            yield f"retry: {STREAM_RETRY_MS}\ndata: {json.dumps(snapshot)}\n\n"
+            if is_finished(snapshot):
+                return
+
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+
+                message = pubsub.get_message(timeout=min(STREAM_KEEPALIVE, remaining))
+                if message is None:
+                    yield ": keep-alive\n\n"
+                    continue
+
+                yield f"data: {message['data']}\n\n"
+                if is_finished(json.loads(message['data'])):
+                    return
+        finally:
+            pubsub.close()
+
+    response = Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    response.call_on_close(close_stream_slot)
+    return response
@@ -1,10 +1,26 @@
 from flask import request, jsonify
 from app.routes import webhook_bp
 from app import db
-from app.models import Webhook
+from app.models import Webhook, WebhookDelivery
+from app.utils import invalidate_webhook_cache
 import requests
 
 
+# Batch settings that must be positive integers
+BATCH_LIMITS = ('batch_window', 'batch_max_events')
+
+
+def batch_settings_error(data):
+    """Return an error message if a webhook's batch settings are invalid, else None"""
+    for field in BATCH_LIMITS:
+        if field not in data:
+            continue
+        value = data[field]
+        if isinstance(value, bool) or not isinstance(value, int) or value <= 0:
+            return f'{field} must be a positive integer'
+    return None
+
+
 @webhook_bp.route('', methods=['GET'])
 def get_webhooks():
     """Get all webhooks"""
@@ -28,14 +44,23 @@ def create_webhook():
     if not data.get('url') or not data.get('event_type'):
         return jsonify({'error': 'URL and event_type are required'}), 400
 
+    error = batch_settings_error(data)
+    if error:
+        return jsonify({'error': error}), 400
+
     webhook = Webhook(
         url=data['url'].strip(),
         event_type=data['event_type'].strip(),
-        enabled=data.get('enabled', True)
+        enabled=data.get('enabled', True),
+        batch_enabled=data.get('batch_enabled', False),
+        batch_window=data.get('batch_window', 10),
+        batch_max_events=data.get('batch_max_events', 100),
+        batch_gzip=data.get('batch_gzip', False)
     )
 
     db.session.add(webhook)
     db.session.commit()
+    invalidate_webhook_cache()
 
     return jsonify(webhook.to_dict()), 201
 
@@ -46,14 +71,22 @@ def update_webhook(webhook_id):
     webhook = Webhook.query.get_or_404(webhook_id)
     data = request.get_json()
 
+    error = batch_settings_error(data)
+    if error:
+        return jsonify({'error': error}), 400
+
     if 'url' in data:
         webhook.url = data['url'].strip()
     if 'event_type' in data:
         webhook.event_type = data['event_type'].strip()
     if 'enabled' in data:
         webhook.enabled = data['enabled']
+    for field in ('batch_enabled', 'batch_window', 'batch_max_events', 'batch_gzip'):
+        if field in data:
+            setattr(webhook, field, data[field])
 
     db.session.commit()
+    invalidate_webhook_cache()
 
     return jsonify(webhook.to_dict())
 
@@ -64,10 +97,25 @@ def delete_webhook(webhook_id):
     webhook = Webhook.query.get_or_404(webhook_id)
     db.session.delete(webhook)
     db.session.commit()
+    invalidate_webhook_cache()
 
     return jsonify({'message': 'Webhook deleted successfully'}), 200
 
 
+@webhook_bp.route('/<int:webhook_id>/deliveries', methods=['GET'])
+def get_webhook_deliveries(webhook_id):
+    """Get the most recent delivery attempts for a webhook"""
+    Webhook.query.get_or_404(webhook_id)
+    limit = min(request.args.get('limit', 50, type=int), 500)
+
+    deliveries = (WebhookDelivery.query
+                  .filter_by(webhook_id=webhook_id)
+                  .order_by(WebhookDelivery.id.desc())
+                  .limit(limit)
+                  .all())
+    return jsonify([delivery.to_dict() for delivery in deliveries])
+
+
 @webhook_bp.route('/<int:webhook_id>/test', methods=['POST'])
 def test_webhook(webhook_id):
     """Test a webhook by sending a test payload"""
@@ -1,119 +1,977 @@
 from app.celery_app import celery
-from app import create_app, db
-from app.models import Product, UploadJob
-from app.utils import trigger_webhook
+from app import db
+from app.models import Product, UploadError, UploadJob, Webhook, WebhookDelivery, utc_now
+from app.ingest import (
+    INGEST_MODES, StageTimer, bulk_upsert_chunk, clear_range_staging, csv_compression, file_checksum, iter_csv_chunks,
+    merge_range_staging, normalize_chunk, open_csv_source, orm_upsert_chunk, resolve_csv_parser,
+    split_csv_ranges, stage_range_rows, stage_rejects, validate_chunk
+)
+from app.utils import (
+    bump_catalog_version, get_catalog_version, get_http_session, publish_upload_status, take_batched_events,
+    trigger_webhook
+)
+from app.metrics import MetricsBatch
+from app.profiling import profile_run
+from app.worker import get_worker_app
+from celery import chord
+from celery.exceptions import SoftTimeLimitExceeded
+from sqlalchemy import delete, select
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.sql import text
 import pandas as pd
+import gzip
+import json
+import requests
 import os
-from datetime import datetime, timezone
+import time
+from datetime import datetime, timedelta, timezone
+
+
+# Errors that leave a consistent checkpoint behind; the task is retried and
+# continues from the last committed chunk
+RESUMABLE_ERRORS = (SoftTimeLimitExceeded, OperationalError)
 
 
 def filter_valid_rows(df):
-    """Filter out empty rows and rows with empty SKUs"""
-    df = df.dropna(how='all')
-    df = df[df['sku'].notna()]
-    df = df[df['sku'].astype(str).str.strip() != '']
-    return df
+    """Filter out blank rows; other invalid rows are rejected by validate_chunk"""
+    return df.dropna(how='all')
 
 
-@celery.task(bind=True)
-def process_csv_upload(self, file_path, job_id):
+def check_error_limit(rejected, max_errors):
+    """Abort an upload once more rows were rejected than it allows"""
+    if max_errors >= 0 and rejected > max_errors:
+        raise ValueError(
+            f"Too many invalid rows: {rejected} rejected, the limit is {max_errors}. "
+            "See the errors file for details"
+        )
+
+
+def estimate_total_rows(processed, offset, file_size):
+    """Extrapolate the valid row count from the bytes consumed so far"""
+    if offset <= 0:
+        return processed
+    return max(processed, int(processed * file_size / offset))
+
+
+def range_count(file_size, max_ranges, min_range_bytes):
+    """Number of byte ranges to split a file into for parallel ingestion"""
+    if max_ranges <= 1:
+        return 1
+    return max(1, min(max_ranges, file_size // max(1, min_range_bytes)))
+
+
+def complete_upload_job(job, file_path, processed, inserted, updated, unchanged=0, rejected=0, stages=None,
+                        catalog_version=None):
+    """Mark a job completed, record its row counts, fire the bulk upload webhook and remove the file"""
+    job.status = 'completed'
+    job.catalog_version = catalog_version
+    job.total_rows = processed + rejected
+    job.processed_rows = processed
+    job.bytes_processed = job.file_size
+    job.inserted_rows = inserted
+    job.updated_rows = updated
+    job.unchanged_rows = unchanged
+    job.rejected_rows = rejected
+    if stages is not None:
+        job.stage_seconds = stages
+    db.session.commit()
+    publish_upload_status(job, 'SUCCESS')
+
+    metrics = MetricsBatch()
+    for outcome, rows in (('inserted', inserted), ('updated', updated), ('unchanged', unchanged),
+                          ('rejected', rejected)):
+        metrics.inc('ingest_rows_total', {'outcome': outcome}, rows)
+    metrics.flush()
+
+    trigger_webhook('product.bulk_upload', {
+        'job_id': job.id,
+        'total_rows': processed,
+        'inserted': inserted,
+        'updated': updated,
+        'unchanged': unchanged,
+        'rejected': rejected,
+        'filename': job.filename
+    })
+
+    if os.path.exists(file_path):
+        os.remove(file_path)
+
+
+def find_identical_upload(job):
+    """
+    Return the latest completed upload if it imported a byte-identical file
+
+    Only the most recent completed upload is considered, so re-sending an
+    older file after a different one was imported is processed normally. It
+    only counts while the catalog version still matches the one recorded by
+    that upload, since any product write since then (a delete, an edit, a
+    batch) may have changed rows the file covers.
+    """
+    if not job.file_checksum:
+        return None
+
+    latest = (
+        UploadJob.query
+        .filter(UploadJob.job_type == 'upload', UploadJob.status == 'completed', UploadJob.id != job.id)
+        .order_by(UploadJob.id.desc())
+        .first()
+    )
+    if not latest or latest.file_checksum != job.file_checksum or latest.catalog_version is None:
+        return None
+
+    version = get_catalog_version()
+    if version is None or int(version) != latest.catalog_version:
+        return None
+    return latest
+
+
+def fail_upload_job(job, file_path, error, status='failed'):
+    """
+    Mark a job failed
+
+    The file is kept so the job can be resumed from its last checkpoint via
+    POST /api/upload/<job_id>/resume.
+    """
+    job.status = status
+    job.error_message = str(error)
+    db.session.commit()
+    publish_upload_status(job, 'RETRY' if status == 'interrupted' else 'FAILURE')
+
+
+def try_fail_upload_job(job, file_path, error, status='failed'):
+    """
+    Mark a job failed without raising
+
+    Used after a resumable error, which usually means the database is
+    unreachable; the status write then fails too and must not stop the task
+    from being retried. The checkpoint is untouched either way.
+    """
+    try:
+        fail_upload_job(job, file_path, error, status)
+    except Exception as e:
+        db.session.rollback()
+        print(f"[Ingest Error] Could not mark upload job {status}: {str(e)}")
+
+
+@celery.task(bind=True, acks_late=True, reject_on_worker_lost=True)
+def process_csv_upload(self, file_path, job_id, mode=None, streaming=None, parallel=None, delta=None,
+                       max_errors=None, profile=False):
     """
     Process CSV file upload in background
 
+    In streaming mode the file is parsed once and progress is reported as bytes
+    consumed, with total_rows estimated from the rows seen so far. Otherwise
+    the file is counted first so total_rows is exact from the start.
+
+    Each chunk is committed together with a checkpoint (byte offset, chunk
+    index and counts) on the UploadJob. When the job already has a checkpoint,
+    for example after a soft time limit, a lost worker or a manual resume,
+    processing continues from the last committed chunk.
+
+    In bulk mode a large file can instead be fanned out: it is split into byte
+    ranges, each range is staged by a process_csv_range subtask, and
+    finalize_csv_upload merges them once the chord completes.
+
+    Gzip and Zstandard files (.csv.gz, .csv.zst) are decompressed while they
+    are parsed. They are always streamed and never split into ranges, since a
+    compressed stream cannot be entered at an arbitrary offset; progress is
+    measured in compressed bytes.
+
+    In delta mode only new products and products whose content hash changes
+    are written; the rest are counted as unchanged. A file whose checksum
+    matches the latest completed upload is not read at all, as long as the
+    catalog has not been written since (see find_identical_upload).
+
+    Rows failing validation are quarantined in upload_errors, with their row
+    number and reasons, while valid rows are committed. The job fails once
+    more than max_errors rows were rejected.
+
     Args:
-        file_path: Path to the uploaded CSV file
+        file_path: Path to the uploaded CSV file, optionally compressed
         job_id: ID of the UploadJob record
+        mode: Ingestion engine, 'bulk' or 'orm' (defaults to INGEST_MODE)
+        streaming: Read the file in a single pass (defaults to INGEST_STREAMING)
+        parallel: Maximum number of byte ranges (defaults to INGEST_PARALLEL_RANGES)
+        delta: Skip unchanged products and already imported files (defaults to INGEST_DELTA)
+        max_errors: Rejected rows tolerated before aborting, -1 for no limit (defaults to INGEST_MAX_ERRORS)
+        profile: Run under cProfile and store the profile as job-<job_id> when PROFILING_ENABLED
+            is on (see app.profiling). Range subtasks of a parallel upload are not included.
     """
-    app = create_app(os.environ.get('FLASK_ENV'))
+    app = get_worker_app()
+
+    if profile and app.config['PROFILING_ENABLED']:
+        with app.app_context():
+            with profile_run(f'job-{job_id}', 'job', os.path.basename(file_path)):
+                return self.run(file_path, job_id, mode, streaming, parallel, delta, max_errors)
 
     with app.app_context():
         job = UploadJob.query.get(job_id)
         if not job:
             return {'error': 'Job not found'}
 
+        mode = mode or app.config['INGEST_MODE']
+        if streaming is None:
+            streaming = app.config['INGEST_STREAMING']
+        if parallel is None:
+            parallel = app.config['INGEST_PARALLEL_RANGES']
+        if delta is None:
+            delta = app.config['INGEST_DELTA']
+        if max_errors is None:
+            max_errors = app.config['INGEST_MAX_ERRORS']
+
         try:
+            if mode not in INGEST_MODES:
+                raise ValueError(f"Unknown ingest mode: {mode}")
+
             if not os.path.exists(file_path):
                 raise FileNotFoundError(f"CSV file not found: {file_path}")
 
+            file_size = os.path.getsize(file_path)
+            compressed = csv_compression(file_path) is not None
+            if compressed:
+                streaming = True
+                parallel = 1
+
             job.status = 'processing'
+            job.file_size = file_size
+            if delta and not job.file_checksum:
+                job.file_checksum = file_checksum(file_path)
             db.session.commit()
+            publish_upload_status(job, 'STARTED')
 
-            df_sample = filter_valid_rows(pd.read_csv(file_path))
-            total_rows = len(df_sample)
+            previous = find_identical_upload(job) if delta else None
+            if previous:
+                print(f"[Ingest] Job {job_id} matches completed job {previous.id}, skipping")
+                # The file's rejected rows are the same, so the errors file is too
+                UploadError.query.filter_by(job_id=job.id).delete()
+                db.session.execute(text("""
+                    INSERT INTO upload_errors (job_id, row, position, error, sku, name, description, price)
+                    SELECT :job_id, row, position, error, sku, name, description, price
+                    FROM upload_errors WHERE job_id = :previous_id
+                """), {'job_id': job.id, 'previous_id': previous.id})
+                complete_upload_job(
+                    job, file_path, previous.processed_rows, 0, 0,
+                    unchanged=previous.processed_rows, rejected=previous.rejected_rows or 0,
+                    catalog_version=previous.catalog_version
+                )
+                return {
+                    'status': 'unchanged',
+                    'processed': previous.processed_rows,
+                    'inserted': 0,
+                    'updated': 0,
+                    'unchanged': previous.processed_rows,
+                    'rejected': previous.rejected_rows or 0,
+                    'duplicate_of': previous.id,
+                    'job_id': job_id
+                }
 
-            if total_rows == 0:
-                raise ValueError("CSV file is empty or has no valid data rows")
+            ranges = range_count(file_size, parallel, app.config['INGEST_RANGE_MIN_BYTES'])
+            if mode == 'bulk' and ranges > 1:
+                return dispatch_csv_ranges(file_path, job, ranges, delta, max_errors)
+
+            resume_offset = job.checkpoint_offset or 0
+            if resume_offset:
+                print(f"[Ingest] Resuming job {job_id} at byte {resume_offset} (chunk {job.checkpoint_chunk})")
+            else:
+                job.processed_rows = 0
+                job.inserted_rows = 0
+                job.updated_rows = 0
+                job.unchanged_rows = 0
+                job.rejected_rows = 0
+                job.checkpoint_chunk = 0
+                job.stage_seconds = None
+                UploadError.query.filter_by(job_id=job.id).delete()
+
+            total_rows = job.total_rows or 0
+            if not streaming and not (resume_offset and total_rows):
+                df_sample = filter_valid_rows(pd.read_csv(file_path, dtype=str))
+                total_rows = len(df_sample)
+                del df_sample
+
+                if total_rows == 0:
+                    raise ValueError("CSV file is empty or has no valid data rows")
 
-            job.total_rows = total_rows
+                job.total_rows = total_rows
             db.session.commit()
 
             chunk_size = 1000
-            processed = 0
+            parser = resolve_csv_parser(app.config['CSV_PARSER'])
+            processed = job.processed_rows or 0
+            inserted = job.inserted_rows or 0
+            updated = job.updated_rows or 0
+            unchanged = job.unchanged_rows or 0
+            rejected = job.rejected_rows or 0
+            chunk_index = job.checkpoint_chunk or 0
+            offset = resume_offset
+            catalog_version = None
+            # Stage totals carry over from the attempts before a resume
+            metrics = MetricsBatch()
+            timer = StageTimer(metrics, {'mode': mode}, job.stage_seconds if resume_offset else None)
 
             try:
-                for chunk_df in pd.read_csv(file_path, chunksize=chunk_size):
-                    chunk_df = filter_valid_rows(chunk_df)
+                with open_csv_source(file_path) as (fh, raw):
+                    chunks = iter_csv_chunks(fh, chunk_size, start=resume_offset or None, parser=parser)
+                    chunk_start = resume_offset
+                    for chunk_df, offset in timer.iterate('parse', chunks):
+                        with timer.stage('validate'):
+                            chunk_df = filter_valid_rows(chunk_df)
+                            chunk_df, rejects = validate_chunk(chunk_df, chunk_start, processed + rejected)
+                            rows = normalize_chunk(chunk_df, chunk_start)
 
-                    for _, row in chunk_df.iterrows():
-                        processed += 1
-                        sku = str(row.get('sku', '')).strip()
+                        with timer.stage('write'):
+                            stage_rejects(job_id, rejects)
+                            if mode == 'bulk':
+                                chunk_inserted, chunk_updated, chunk_unchanged = bulk_upsert_chunk(rows, delta)
+                            else:
+                                chunk_inserted, chunk_updated, chunk_unchanged = orm_upsert_chunk(rows, delta, timer)
 
-                        product = Product.query.filter(Product.sku.ilike(sku)).first()
+                        processed += len(chunk_df)
+                        rejected += len(rejects)
+                        chunk_start = offset
+                        chunk_index += 1
+                        inserted += chunk_inserted
+                        updated += chunk_updated
+                        unchanged += chunk_unchanged
+                        # Offsets are decompressed positions; progress follows the file on disk
+                        bytes_read = min(raw.tell(), file_size) if compressed else offset
 
-                        if product:
-                            product.name = str(row.get('name', product.name)).strip()
-                            product.description = str(row.get('description', '')).strip() if pd.notna(row.get('description')) else product.description
+                        if streaming:
+                            estimated_rows = estimate_total_rows(processed, bytes_read, file_size)
+                            percent = int((bytes_read / file_size) * 100) if file_size else 100
                         else:
-                            product = Product(
-                                sku=sku,
-                                name=str(row.get('name', '')).strip(),
-                                description=str(row.get('description', '')).strip() if pd.notna(row.get('description')) else None,
-                                active=True
-                            )
-                            db.session.add(product)
-
-                    self.update_state(
-                        state='PROGRESS',
-                        meta={
+                            estimated_rows = total_rows
+                            percent = int(((processed + rejected) / total_rows) * 100)
+
+                        # The chunk and its checkpoint commit together
+                        with timer.stage('commit'):
+                            job.processed_rows = processed
+                            job.inserted_rows = inserted
+                            job.updated_rows = updated
+                            job.unchanged_rows = unchanged
+                            job.rejected_rows = rejected
+                            job.total_rows = estimated_rows
+                            job.bytes_processed = bytes_read
+                            job.checkpoint_offset = offset
+                            job.checkpoint_chunk = chunk_index
+                            job.stage_seconds = timer.as_dict()
+                            db.session.commit()
+                            catalog_version = bump_catalog_version()
+
+                        progress = {
                             'current': processed,
-                            'total': total_rows,
-                            'percent': int((processed / total_rows) * 100)
+                            'total': estimated_rows,
+                            'percent': percent,
+                            'bytes_read': bytes_read,
+                            'bytes_total': file_size,
+                            'chunk': chunk_index,
+                            'chunk_inserted': chunk_inserted,
+                            'chunk_updated': chunk_updated,
+                            'chunk_unchanged': chunk_unchanged,
+                            'inserted': inserted,
+                            'updated': updated,
+                            'unchanged': unchanged,
+                            'rejected': rejected
                         }
-                    )
+                        self.update_state(state='PROGRESS', meta=progress)
+                        publish_upload_status(job, 'PROGRESS', progress)
 
-                db.session.commit()
+                        check_error_limit(rejected, max_errors)
 
+            except RESUMABLE_ERRORS:
+                db.session.rollback()
+                raise
             except Exception as e:
                 db.session.rollback()
                 raise Exception(f"Upload failed at row {processed}: {str(e)}")
+            finally:
+                metrics.flush()
 
-            job.status = 'completed'
-            job.processed_rows = total_rows
+            if processed == 0:
+                raise ValueError("CSV file is empty or has no valid data rows")
+
+            complete_upload_job(
+                job, file_path, processed, inserted, updated, unchanged, rejected, timer.as_dict(), catalog_version
+            )
+
+            return {
+                'status': 'completed',
+                'processed': processed,
+                'inserted': inserted,
+                'updated': updated,
+                'unchanged': unchanged,
+                'rejected': rejected,
+                'chunks': chunk_index,
+                'resumed_from': resume_offset,
+                'mode': mode,
+                'stages': timer.as_dict(),
+                'job_id': job_id
+            }
+
+        except RESUMABLE_ERRORS as e:
+            db.session.rollback()
+            max_retries = app.config['INGEST_MAX_RESUMES']
+            if self.request.retries >= max_retries:
+                try_fail_upload_job(job, file_path, f"Upload interrupted {max_retries} times: {str(e)}")
+                raise
+
+            try_fail_upload_job(job, file_path, e, status='interrupted')
+            raise self.retry(exc=e, countdown=2 ** self.request.retries, max_retries=max_retries)
+
+        except Exception as e:
+            db.session.rollback()
+            fail_upload_job(job, file_path, e)
+            raise
+
+
+def dispatch_csv_ranges(file_path, job, ranges, delta=False, max_errors=-1):
+    """Split a file into byte ranges and fan them out as a chord"""
+    with open(file_path, 'rb') as fh:
+        byte_ranges = split_csv_ranges(fh, ranges)
+
+    clear_range_staging(job.id)
+    UploadError.query.filter_by(job_id=job.id).delete()
+    job.total_rows = 0
+    job.processed_rows = 0
+    job.rejected_rows = 0
+    job.bytes_processed = 0
+    job.checkpoint_offset = 0
+    job.checkpoint_chunk = 0
+    db.session.commit()
+    publish_upload_status(job, 'PROGRESS', job.byte_progress())
+
+    chord(
+        process_csv_range.s(file_path, job.id, start, end, max_errors)
+        for start, end in byte_ranges
+    )(finalize_csv_upload.s(file_path, job.id, delta).on_error(clear_failed_ranges.s(job.id)))
+
+    return {
+        'status': 'dispatched',
+        'ranges': len(byte_ranges),
+        'mode': 'bulk',
+        'job_id': job.id
+    }
+
+
+@celery.task(bind=True)
+def process_csv_range(self, file_path, job_id, start, end, max_errors=-1):
+    """
+    Stage one byte range of a CSV file for a parallel upload
+
+    Progress is added to the shared UploadJob row atomically, so the status
+    endpoint shows the combined progress of every range. Rejected rows are
+    numbered from the start of the range; finalize_csv_upload shifts them to
+    file row numbers.
+
+    Once another range has failed the job, a range stops at its next chunk and
+    clears the job's staging rows again, since it may have committed rows
+    after the failing range cleared them.
+
+    Args:
+        file_path: Path to the uploaded CSV file
+        job_id: ID of the UploadJob record
+        start: Byte offset of the first record in the range
+        end: Byte offset just after the last record in the range
+        max_errors: Rejected rows tolerated across all ranges, -1 for no limit
+    """
+    app = get_worker_app()
+
+    with app.app_context():
+        chunk_size = 1000
+        parser = resolve_csv_parser(app.config['CSV_PARSER'])
+        processed = 0
+        rejected = 0
+        chunk_start = start
+        metrics = MetricsBatch()
+        timer = StageTimer(metrics, {'mode': 'bulk'})
+
+        try:
+            with open(file_path, 'rb') as fh:
+                for chunk_df, offset in timer.iterate('parse', iter_csv_chunks(fh, chunk_size, start, end, parser)):
+                    job = db.session.get(UploadJob, job_id)
+                    if not job or job.status == 'failed':
+                        return abort_csv_range(job_id, start, end)
+
+                    with timer.stage('validate'):
+                        chunk_df = filter_valid_rows(chunk_df)
+                        chunk_df, rejects = validate_chunk(chunk_df, chunk_start, processed + rejected)
+                        rows = normalize_chunk(chunk_df, chunk_start)
+
+                    with timer.stage('write'):
+                        stage_rejects(job_id, rejects)
+                        stage_range_rows(job_id, rows)
+
+                    with timer.stage('commit'):
+                        db.session.execute(text("""
+                            UPDATE upload_jobs SET
+                                processed_rows = processed_rows + :rows,
+                                rejected_rows = rejected_rows + :rejected,
+                                bytes_processed = bytes_processed + :bytes,
+                                total_rows = GREATEST(
+                                    processed_rows + :rows,
+                                    (processed_rows + :rows) * file_size / GREATEST(bytes_processed + :bytes, 1)
+                                )
+                            WHERE id = :job_id
+                        """), {
+                            'rows': len(chunk_df),
+                            'rejected': len(rejects),
+                            'bytes': offset - chunk_start,
+                            'job_id': job_id
+                        })
+                        db.session.commit()
+
+                        db.session.refresh(job)
+                        publish_upload_status(job, 'PROGRESS', job.byte_progress())
+
+                    processed += len(chunk_df)
+                    rejected += len(rejects)
+                    chunk_start = offset
+
+                    check_error_limit(job.rejected_rows, max_errors)
+
+        except Exception as e:
+            db.session.rollback()
+            job = db.session.get(UploadJob, job_id)
+            if job:
+                clear_range_staging(job_id)
+                fail_upload_job(job, file_path, f"Upload failed in byte range {start}-{end}: {str(e)}")
+            raise
+        finally:
+            metrics.flush()
+
+        db.session.expire_all()
+        job = db.session.get(UploadJob, job_id)
+        if not job or job.status == 'failed':
+            return abort_csv_range(job_id, start, end)
+
+        return {
+            'status': 'staged',
+            'processed': processed,
+            'rejected': rejected,
+            'start': start,
+            'end': end,
+            'stages': timer.as_dict()
+        }
+
+
+def abort_csv_range(job_id, start, end):
+    """Stop a range of a failed parallel upload and drop the job's staged rows"""
+    clear_range_staging(job_id)
+    db.session.commit()
+    return {'status': 'aborted', 'start': start, 'end': end}
+
+
+@celery.task
+def clear_failed_ranges(request, exc, traceback, job_id):
+    """
+    Chord error callback of a parallel upload: drop the job's staged rows
+
+    finalize_csv_upload never runs when a range fails, so this is what
+    empties upload_staging for the job. It runs once the failing range has
+    marked the job failed; ranges still running clear again when they stop.
+    """
+    app = get_worker_app()
+
+    with app.app_context():
+        clear_range_staging(job_id)
+        db.session.commit()
+        print(f"[Ingest] Cleared staged rows of failed parallel upload {job_id}")
+
+
+def renumber_range_errors(job_id, results):
+    """Turn range-relative row numbers of rejected rows into file row numbers"""
+    base = 0
+    for result in sorted(results, key=lambda result: result['start']):
+        if base and result.get('rejected'):
+            db.session.execute(text("""
+                UPDATE upload_errors SET row = row + :base
+                WHERE job_id = :job_id AND position >= :start AND position < :end
+            """), {'base': base, 'job_id': job_id, 'start': result['start'], 'end': result['end']})
+        base += result.get('processed', 0) + result.get('rejected', 0)
+
+
+@celery.task(bind=True)
+def finalize_csv_upload(self, results, file_path, job_id, delta=False):
+    """
+    Merge the staged ranges of a parallel upload and complete the job
+
+    Args:
+        results: Return values of the process_csv_range subtasks
+        file_path: Path to the uploaded CSV file
+        job_id: ID of the UploadJob record
+        delta: Only write new or changed products
+    """
+    app = get_worker_app()
+
+    with app.app_context():
+        job = db.session.get(UploadJob, job_id)
+        if not job:
+            return {'error': 'Job not found'}
+
+        try:
+            processed = sum(result.get('processed', 0) for result in results)
+            rejected = sum(result.get('rejected', 0) for result in results)
+            renumber_range_errors(job_id, results)
             db.session.commit()
 
-            trigger_webhook('product.bulk_upload', {
-                'job_id': job_id,
-                'total_rows': total_rows,
-                'filename': job.filename
-            })
+            if processed == 0:
+                raise ValueError("CSV file is empty or has no valid data rows")
 
-            if os.path.exists(file_path):
-                os.remove(file_path)
+            # Range stages add up across workers, so they are CPU-seconds rather than wall time
+            metrics = MetricsBatch()
+            timer = StageTimer(metrics, {'mode': 'bulk'})
+            for result in results:
+                for stage, seconds in result.get('stages', {}).items():
+                    timer.totals[stage] = timer.totals.get(stage, 0.0) + seconds
+
+            try:
+                with timer.stage('merge'):
+                    inserted, updated, unchanged = merge_range_staging(job_id, delta)
+                    db.session.commit()
+                catalog_version = bump_catalog_version()
+            except Exception as e:
+                db.session.rollback()
+                clear_range_staging(job_id)
+                db.session.commit()
+                raise Exception(f"Upload failed while merging staged rows: {str(e)}")
+            finally:
+                metrics.flush()
+
+            complete_upload_job(
+                job, file_path, processed, inserted, updated, unchanged, rejected, timer.as_dict(), catalog_version
+            )
 
             return {
                 'status': 'completed',
-                'processed': total_rows,
+                'processed': processed,
+                'inserted': inserted,
+                'updated': updated,
+                'unchanged': unchanged,
+                'rejected': rejected,
+                'ranges': len(results),
+                'mode': 'bulk',
+                'stages': timer.as_dict(),
                 'job_id': job_id
             }
 
         except Exception as e:
+            fail_upload_job(job, file_path, e)
+            raise
+
+
+@celery.task
+def purge_upload_files():
+    """
+    Remove uploaded files that are no longer needed
+
+    Failed and interrupted jobs keep their file so they can be resumed, and
+    chunked sessions keep theirs while receiving. Files not written for
+    UPLOAD_RETENTION_HOURS are removed, the job's file_path is cleared so a
+    resume answers 410, and abandoned sessions are marked failed. Runs hourly
+    from the beat scheduler of the exports worker.
+    """
+    app = get_worker_app()
+
+    with app.app_context():
+        cutoff = time.time() - app.config['UPLOAD_RETENTION_HOURS'] * 3600
+        jobs = UploadJob.query.filter(
+            UploadJob.job_type == 'upload',
+            UploadJob.status.in_(('failed', 'interrupted', 'receiving')),
+            UploadJob.file_path.isnot(None)
+        ).all()
+
+        purged = 0
+        for job in jobs:
+            try:
+                if os.path.getmtime(job.file_path) >= cutoff:
+                    continue
+                os.remove(job.file_path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"[Purge Error] Failed to remove {job.file_path}: {str(e)}")
+                continue
+
+            if job.status == 'receiving':
+                job.status = 'failed'
+                job.error_message = 'Upload session expired'
+            job.file_path = None
+            purged += 1
+        db.session.commit()
+
+        if purged:
+            print(f"[Purge] Removed the files of {purged} upload jobs")
+        return {'purged': purged}
+
+
+@celery.task
+def purge_webhook_deliveries():
+    """
+    Remove webhook delivery records older than WEBHOOK_DELIVERY_RETENTION_DAYS
+
+    Every delivery attempt is logged, so the table grows with each event.
+    Rows are deleted oldest first in batches of BULK_DELETE_BATCH_SIZE, each
+    in its own transaction, using the created_at index. A retention of 0
+    keeps every record. Runs hourly from the beat scheduler of the exports
+    worker.
+    """
+    app = get_worker_app()
+
+    with app.app_context():
+        retention_days = app.config['WEBHOOK_DELIVERY_RETENTION_DAYS']
+        if retention_days <= 0:
+            return {'purged': 0}
+
+        cutoff = utc_now() - timedelta(days=retention_days)
+        batch_size = app.config['BULK_DELETE_BATCH_SIZE']
+
+        purged = 0
+        while True:
+            batch_ids = (
+                select(WebhookDelivery.id)
+                .where(WebhookDelivery.created_at < cutoff)
+                .order_by(WebhookDelivery.created_at)
+                .limit(batch_size)
+                .scalar_subquery()
+            )
+            deleted = db.session.execute(
+                delete(WebhookDelivery).where(WebhookDelivery.id.in_(batch_ids)),
+                execution_options={'synchronize_session': False}
+            ).rowcount
+            db.session.commit()
+
+            purged += deleted
+            if deleted < batch_size:
+                break
+
+        if purged:
+            print(f"[Purge] Removed {purged} webhook delivery records")
+        return {'purged': purged}
+
+
+def product_delete_conditions(filters):
+    """
+    WHERE conditions selecting the products a bulk delete removes
+
+    Args:
+        filters: Dict with optional 'active' (bool) and 'skus' (list of SKUs)
+    """
+    conditions = []
+    if filters.get('active') is not None:
+        conditions.append(Product.active == filters['active'])
+    if filters.get('skus'):
+        conditions.append(Product.sku.in_(filters['skus']))
+    return conditions
+
+
+@celery.task(bind=True, acks_late=True, reject_on_worker_lost=True)
+def delete_products(self, job_id, filters):
+    """
+    Delete matching products in bounded batches
+
+    Each batch removes at most BULK_DELETE_BATCH_SIZE rows in its own short
+    transaction, walking ids upwards so no batch rescans rows already visited.
+    Progress is tracked on the UploadJob like an upload, and product.bulk_delete
+    fires once the job finishes. A redelivered task simply continues, since the
+    rows already deleted no longer match.
+
+    Args:
+        job_id: ID of the UploadJob (job_type 'bulk_delete') tracking the delete
+        filters: Dict with optional 'active' and 'skus', see product_delete_conditions
+    """
+    app = get_worker_app()
+
+    with app.app_context():
+        job = db.session.get(UploadJob, job_id)
+        if not job:
+            return {'error': 'Job not found'}
+
+        batch_size = app.config['BULK_DELETE_BATCH_SIZE']
+        conditions = product_delete_conditions(filters)
+
+        try:
+            job.status = 'processing'
+            job.total_rows = db.session.execute(
+                select(db.func.count()).select_from(Product).where(*conditions)
+            ).scalar() + (job.processed_rows or 0)
+            db.session.commit()
+            publish_upload_status(job, 'STARTED')
+
+            deleted = job.processed_rows or 0
+            last_id = 0
+            while True:
+                batch_ids = (
+                    select(Product.id)
+                    .where(*conditions, Product.id > last_id)
+                    .order_by(Product.id)
+                    .limit(batch_size)
+                    .scalar_subquery()
+                )
+                ids = db.session.execute(
+                    delete(Product).where(Product.id.in_(batch_ids)).returning(Product.id),
+                    execution_options={'synchronize_session': False}
+                ).scalars().all()
+                if not ids:
+                    break
+
+                deleted += len(ids)
+                last_id = max(ids)
+                job.processed_rows = deleted
+                db.session.commit()
+                bump_catalog_version()
+
+                progress = {
+                    'current': deleted,
+                    'total': job.total_rows,
+                    'percent': int(deleted / job.total_rows * 100) if job.total_rows else 100
+                }
+                self.update_state(state='PROGRESS', meta=progress)
+                publish_upload_status(job, 'PROGRESS', progress)
+
+            job.status = 'completed'
+            job.total_rows = deleted
+            db.session.commit()
+            publish_upload_status(job, 'SUCCESS')
+
+            trigger_webhook('product.bulk_delete', {
+                'job_id': job.id,
+                'count': deleted,
+                'filters': filters,
+                'message': f'{deleted} products deleted'
+            })
+
+            return {'status': 'completed', 'deleted': deleted}
+
+        except Exception as e:
+            db.session.rollback()
             job.status = 'failed'
             job.error_message = str(e)
             db.session.commit()
+            publish_upload_status(job, 'FAILURE')
+            print(f"[Delete Error] Job {job_id}: {str(e)}")
+            raise
 
-            if os.path.exists(file_path):
-                os.remove(file_path)
 
-            raise
+@celery.task(bind=True, max_retries=None)
+def deliver_webhook(self, webhook_id, url, payload, compress=False):
+    """
+    Deliver one webhook payload, retrying with exponential backoff
+
+    Runs on the 'webhooks' queue over a pooled keep-alive session for the
+    target host. Every attempt is recorded in webhook_deliveries. Connection
+    errors, 5xx and 429 responses are retried; other 4xx responses are not.
+    A delivery whose webhook was deleted or disabled while it was queued or
+    waiting for a retry is dropped.
+
+    Args:
+        webhook_id: ID of the Webhook record
+        url: Target URL
+        payload: JSON payload to POST, an event or a list of batched events
+        compress: Send the body gzip-compressed with Content-Encoding: gzip
+    """
+    app = get_worker_app()
+
+    with app.app_context():
+        webhook = db.session.get(Webhook, webhook_id)
+        if not webhook or not webhook.enabled:
+            print(f"[Webhook] Dropped delivery to {url} for removed webhook {webhook_id}")
+            return {'status': 'dropped', 'webhook_id': webhook_id}
+
+        max_retries = app.config['WEBHOOK_MAX_RETRIES']
+        attempt = self.request.retries + 1
+        status_code = None
+        error = None
+
+        headers = {'Content-Type': 'application/json'}
+        body = json.dumps(payload).encode('utf-8')
+        if compress:
+            body = gzip.compress(body)
+            headers['Content-Encoding'] = 'gzip'
+
+        started = time.monotonic()
+        try:
+            response = get_http_session(url).post(
+                url,
+                data=body,
+                timeout=app.config['WEBHOOK_TIMEOUT'],
+                headers=headers
+            )
+            status_code = response.status_code
+            if status_code >= 400:
+                error = f'HTTP {status_code}'
+        except requests.exceptions.RequestException as e:
+            error = str(e)
+        response_time = time.monotonic() - started
+
+        retryable = error is not None and (status_code is None or status_code >= 500 or status_code == 429)
+        will_retry = retryable and self.request.retries < max_retries
+
+        if error is None:
+            status = 'success'
+        elif will_retry:
+            status = 'retrying'
+        else:
+            status = 'failed'
+
+        event_type = 'batch' if isinstance(payload, list) else payload.get('event', '')
+        db.session.add(WebhookDelivery(
+            webhook_id=webhook_id,
+            event_type=event_type,
+            url=url,
+            attempt=attempt,
+            status=status,
+            status_code=status_code,
+            response_time=response_time,
+            error_message=error
+        ))
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # The webhook was deleted during the attempt
+            db.session.rollback()
+            print(f"[Webhook] Dropped delivery to {url} for removed webhook {webhook_id}")
+            return {'status': 'dropped', 'webhook_id': webhook_id}
+
+        print(f"[Webhook] {event_type} to {url} attempt {attempt}: {status_code or error} ({status})")
+
+        metrics = MetricsBatch()
+        metrics.observe('webhook_delivery_seconds', response_time, {'outcome': status})
+        if error is not None:
+            metrics.inc('webhook_delivery_failures_total', {'reason': f'http_{status_code}' if status_code else 'connection'})
+        metrics.flush()
+
+        if will_retry:
+            countdown = app.config['WEBHOOK_RETRY_BACKOFF'] * 2 ** self.request.retries
+            raise self.retry(countdown=countdown, max_retries=max_retries)
+
+        return {
+            'status': status,
+            'status_code': status_code,
+            'attempt': attempt,
+            'webhook_id': webhook_id
+        }
+
+
+@celery.task
+def flush_webhook_batch(webhook_id):
+    """
+    Send the events buffered for a batching webhook as one JSON array
+
+    Args:
+        webhook_id: ID of the Webhook record
+    """
+    app = get_worker_app()
+
+    with app.app_context():
+        events = take_batched_events(webhook_id)
+        if not events:
+            return {'status': 'empty', 'webhook_id': webhook_id}
+
+        webhook = db.session.get(Webhook, webhook_id)
+        if not webhook or not webhook.enabled:
+            print(f"[Webhook] Dropped {len(events)} batched events for removed webhook {webhook_id}")
+            return {'status': 'dropped', 'events': len(events), 'webhook_id': webhook_id}
 
+        deliver_webhook.delay(webhook.id, webhook.url, events, compress=webhook.batch_gzip)
+        print(f"[Webhook] Flushed {len(events)} batched events to {webhook.url}")
 
+        return {'status': 'queued', 'events': len(events), 'webhook_id': webhook_id}
@@ -1,39 +1,326 @@
 """
 Common utility functions
 """
+from flask import current_app, make_response, request
 from app.models import Webhook
+from functools import wraps
+from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter
+import hashlib
+import json
+import redis
 import requests
+import uuid
 from datetime import datetime, timezone
 
 
+WEBHOOKS_VERSION_KEY = 'webhooks:version'
+WEBHOOK_BATCH_KEY = 'webhook:batch:{webhook_id}'
+WEBHOOK_BATCH_TIMER_KEY = 'webhook:batch:{webhook_id}:timer'
+
+CATALOG_VERSION_KEY = 'catalog:version'
+CATALOG_CACHE_KEY = 'catalog:cache:{version}:{digest}'
+
+UPLOAD_STATUS_KEY = 'upload:status:{task_id}'
+UPLOAD_PROGRESS_CHANNEL = 'upload:progress:{task_id}'
+UPLOAD_STATUS_TTL = 24 * 60 * 60
+
+_redis_clients = {}
+
+# Enabled webhooks per event type, valid while the Redis version matches
+_webhook_cache = {'version': None, 'by_event': {}}
+
+# Keep-alive HTTP sessions per scheme://host, reused across deliveries in a worker process
+_http_sessions = {}
+
+
+def get_http_session(url, pool_size=10):
+    """
+    Return a pooled keep-alive session for the host of a URL
+
+    Args:
+        url: Target URL
+        pool_size: Maximum connections kept open to the host
+    """
+    parts = urlsplit(url)
+    key = f'{parts.scheme}://{parts.netloc}'
+
+    session = _http_sessions.get(key)
+    if session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        _http_sessions[key] = session
+
+    return session
+
+
+def get_redis():
+    """Return a shared Redis client for the app's REDIS_URL"""
+    url = current_app.config['REDIS_URL']
+    client = _redis_clients.get(url)
+    if client is None:
+        client = redis.Redis.from_url(url, decode_responses=True)
+        _redis_clients[url] = client
+    return client
+
+
+def get_catalog_version():
+    """Return the current catalog version, or None when Redis is unavailable"""
+    try:
+        return get_redis().get(CATALOG_VERSION_KEY) or '0'
+    except redis.RedisError as e:
+        print(f"[Cache Error] Catalog version unavailable: {str(e)}")
+        return None
+
+
+def bump_catalog_version():
+    """
+    Invalidate cached product responses after the catalog changed
+
+    Returns:
+        The new catalog version, or None when Redis is unavailable
+    """
+    try:
+        return get_redis().incr(CATALOG_VERSION_KEY)
+    except redis.RedisError as e:
+        print(f"[Cache Error] Failed to bump catalog version: {str(e)}")
+        return None
+
+
+def catalog_cached(view):
+    """
+    Cache a product read endpoint in Redis and answer conditional requests
+
+    Responses are keyed by path, normalized query parameters and the catalog
+    version, which every product write bumps. The ETag is derived from the
+    same key, so If-None-Match is answered with 304 before any query runs.
+    Without Redis the view is called directly.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        version = get_catalog_version()
+        if version is None:
+            return view(*args, **kwargs)
+
+        params = sorted(request.args.items(multi=True))
+        digest = hashlib.sha1(json.dumps([request.path, params]).encode('utf-8')).hexdigest()
+        etag = f'{version}-{digest[:20]}'
+
+        if request.if_none_match.contains(etag):
+            response = current_app.response_class(status=304)
+        else:
+            key = CATALOG_CACHE_KEY.format(version=version, digest=digest)
+            try:
+                body = get_redis().get(key)
+            except redis.RedisError:
+                body = None
+
+            if body is not None:
+                response = current_app.response_class(body, mimetype='application/json')
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                try:
+                    get_redis().setex(key, current_app.config['CATALOG_CACHE_TTL'], response.get_data(as_text=True))
+                except redis.RedisError as e:
+                    print(f"[Cache Error] Failed to store {request.path}: {str(e)}")
+
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+    return wrapper
+
+
+def publish_upload_status(job, state, progress=None):
+    """
+    Publish an upload job's status to Redis
+
+    The latest message is kept in the upload:status:<task_id> hash for the
+    polling endpoint and broadcast on upload:progress:<task_id> for streams.
+    Messages have the same shape as /api/upload/status responses.
+
+    Args:
+        job: UploadJob being processed
+        state: Celery-style state (STARTED, PROGRESS, RETRY, SUCCESS, FAILURE)
+        progress: Optional progress dict (current, total, percent, ...)
+    """
+    if not job.task_id:
+        return
+
+    message = {'task_id': job.task_id, 'status': state, 'job': job.to_dict()}
+    if progress is not None:
+        message['progress'] = progress
+    encoded = json.dumps(message)
+
+    try:
+        key = UPLOAD_STATUS_KEY.format(task_id=job.task_id)
+        pipe = get_redis().pipeline()
+        pipe.hset(key, mapping={'status': state, 'message': encoded})
+        pipe.expire(key, UPLOAD_STATUS_TTL)
+        pipe.publish(UPLOAD_PROGRESS_CHANNEL.format(task_id=job.task_id), encoded)
+        pipe.execute()
+    except redis.RedisError as e:
+        print(f"[Upload Error] Failed to publish status for {job.task_id}: {str(e)}")
+
+
+def get_upload_status(task_id):
+    """Return the last published status message for an upload, or None"""
+    try:
+        encoded = get_redis().hget(UPLOAD_STATUS_KEY.format(task_id=task_id), 'message')
+    except redis.RedisError as e:
+        print(f"[Upload Error] Failed to read status for {task_id}: {str(e)}")
+        return None
+    return json.loads(encoded) if encoded else None
+
+
+def get_enabled_webhooks(event_type):
+    """
+    Return enabled webhooks for an event type as plain dicts
+
+    Results are cached per process and dropped whenever the version counter in
+    Redis changes, so every web and worker process sees subscription changes
+    without querying the database on each event. If Redis is unavailable the
+    database is queried directly.
+
+    Args:
+        event_type: Type of event (e.g., 'product.created')
+    """
+    try:
+        version = get_redis().get(WEBHOOKS_VERSION_KEY) or '0'
+    except redis.RedisError as e:
+        print(f"[Webhook Error] Cache version unavailable: {str(e)}")
+        version = None
+
+    if version is None or version != _webhook_cache['version']:
+        _webhook_cache['by_event'] = {}
+        _webhook_cache['version'] = version
+
+    webhooks = _webhook_cache['by_event'].get(event_type)
+    if webhooks is None:
+        webhooks = [
+            {
+                'id': webhook.id,
+                'url': webhook.url,
+                'batch_enabled': webhook.batch_enabled,
+                'batch_window': webhook.batch_window,
+                'batch_max_events': webhook.batch_max_events,
+                'batch_gzip': webhook.batch_gzip
+            }
+            for webhook in Webhook.query.filter_by(event_type=event_type, enabled=True).all()
+        ]
+        if version is not None:
+            _webhook_cache['by_event'][event_type] = webhooks
+
+    return webhooks
+
+
+def invalidate_webhook_cache():
+    """Bump the webhook version in Redis so every process reloads subscriptions"""
+    _webhook_cache['by_event'] = {}
+    _webhook_cache['version'] = None
+    try:
+        get_redis().incr(WEBHOOKS_VERSION_KEY)
+    except redis.RedisError as e:
+        print(f"[Webhook Error] Failed to invalidate webhook cache: {str(e)}")
+
+
+def queue_batched_event(webhook, payload):
+    """
+    Buffer an event for a batching webhook in Redis
+
+    Events are stored in a hash keyed by event type and product id, so repeated
+    updates of a product within a window collapse into its latest state. The
+    first event of a window schedules a flush after batch_window seconds, and
+    reaching batch_max_events flushes immediately.
+
+    Args:
+        webhook: Cached webhook dict from get_enabled_webhooks
+        payload: Event payload as built by trigger_webhook
+    """
+    from app.tasks import flush_webhook_batch
+
+    data = payload.get('data')
+    if isinstance(data, dict) and data.get('id') is not None:
+        field = f"{payload['event']}:{data['id']}"
+    else:
+        field = uuid.uuid4().hex
+
+    webhook_id = webhook['id']
+    window = max(1, webhook['batch_window'])
+
+    pipe = get_redis().pipeline()
+    pipe.hset(WEBHOOK_BATCH_KEY.format(webhook_id=webhook_id), field, json.dumps(payload))
+    pipe.hlen(WEBHOOK_BATCH_KEY.format(webhook_id=webhook_id))
+    pipe.set(WEBHOOK_BATCH_TIMER_KEY.format(webhook_id=webhook_id), 1, nx=True, ex=window * 2)
+    _, pending, window_started = pipe.execute()
+
+    if pending >= webhook['batch_max_events']:
+        flush_webhook_batch.delay(webhook_id)
+    elif window_started:
+        flush_webhook_batch.apply_async(args=[webhook_id], countdown=window)
+
+
+def take_batched_events(webhook_id):
+    """
+    Atomically take the buffered events of a webhook, oldest first
+
+    The timer is cleared before the buffer is renamed away, so an event that
+    arrives in between always has a flush scheduled for it.
+    """
+    client = get_redis()
+    client.delete(WEBHOOK_BATCH_TIMER_KEY.format(webhook_id=webhook_id))
+
+    taken_key = f'{WEBHOOK_BATCH_KEY.format(webhook_id=webhook_id)}:taken:{uuid.uuid4().hex}'
+    try:
+        client.rename(WEBHOOK_BATCH_KEY.format(webhook_id=webhook_id), taken_key)
+    except redis.ResponseError:
+        return []
+
+    pipe = client.pipeline()
+    pipe.hvals(taken_key)
+    pipe.delete(taken_key)
+    values, _ = pipe.execute()
+
+    return sorted((json.loads(value) for value in values), key=lambda event: event['timestamp'])
+
+
 def trigger_webhook(event_type, data):
     """
-    Trigger webhooks for a given event type
+    Queue webhook deliveries for a given event type
+
+    Each enabled webhook gets its own deliver_webhook task on the 'webhooks'
+    queue, so callers return as soon as the deliveries are enqueued. Webhooks
+    with batching enabled buffer the event instead (see queue_batched_event).
 
     Args:
         event_type: Type of event (e.g., 'product.created', 'product.bulk_upload')
         data: Event data to send in webhook payload
     """
+    from app.tasks import deliver_webhook
+
     try:
-        webhooks = Webhook.query.filter_by(event_type=event_type, enabled=True).all()
+        webhooks = get_enabled_webhooks(event_type)
         print(f"[Webhook] Found {len(webhooks)} webhooks for {event_type}")
 
+        payload = {
+            'event': event_type,
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'data': data
+        }
+
         for webhook in webhooks:
             try:
-                payload = {
-                    'event': event_type,
-                    'timestamp': datetime.now(timezone.utc).isoformat(),
-                    'data': data
-                }
-                print(f"[Webhook] Sending {event_type} to {webhook.url}")
-                response = requests.post(
-                    webhook.url,
-                    json=payload,
-                    timeout=10,
-                    headers={'Content-Type': 'application/json'}
-                )
-                print(f"[Webhook] Response: {response.status_code}")
+                if webhook['batch_enabled']:
+                    queue_batched_event(webhook, payload)
+                    print(f"[Webhook] Buffered {event_type} for {webhook['url']}")
+                else:
+                    deliver_webhook.delay(webhook['id'], webhook['url'], payload)
+                    print(f"[Webhook] Queued {event_type} for {webhook['url']}")
             except Exception as e:
-                print(f"[Webhook Error] {webhook.url}: {str(e)}")
+                print(f"[Webhook Error] {webhook['url']}: {str(e)}")
     except Exception as e:
         print(f"[Webhook Error] Failed to query webhooks: {str(e)}")
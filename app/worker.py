@@ -0,0 +1,162 @@
+"""
+Celery worker process lifecycle
+
+Each worker process builds one Flask app and SQLAlchemy engine and reuses it
+for every task. Prefork children create theirs in worker_process_init, after
+the fork, so no connection is ever shared with the parent. Pools that run
+tasks in threads or greenlets of a single process build it in worker_init,
+with a connection pool sized to the worker's concurrency.
+"""
+from celery import signals
+from sqlalchemy.sql import text
+from app import create_app, db
+from app.celery_app import INGEST_QUEUES, TASK_QUEUES, UPLOAD_TASK
+from app.utils import get_redis
+from config import config
+import os
+import time
+
+# Pools whose tasks run in forked child processes (one task at a time each)
+PROCESS_POOLS = {'prefork', 'processes', 'solo'}
+
+_worker = {'app': None, 'pool': None, 'concurrency': 1}
+
+
+def pool_name(pool_cls):
+    """Return the short name of a Celery pool ('prefork', 'threads', ...)"""
+    if isinstance(pool_cls, str):
+        return pool_cls.rsplit('.', 1)[-1].split(':')[0]
+    return pool_cls.__module__.rsplit('.', 1)[-1]
+
+
+def engine_options(app_config, slots):
+    """
+    Return SQLAlchemy engine options for a process running `slots` tasks at once
+
+    Args:
+        app_config: Config class of the worker
+        slots: Number of tasks the process can run concurrently
+    """
+    return {
+        **app_config.SQLALCHEMY_ENGINE_OPTIONS,
+        'pool_size': slots,
+        'max_overflow': app_config.WORKER_DB_MAX_OVERFLOW
+    }
+
+
+def build_worker_app(slots):
+    """Create and warm up the app of this worker process"""
+    config_name = os.environ.get('FLASK_ENV') or 'default'
+    app = create_app(config_name, {
+        'SQLALCHEMY_ENGINE_OPTIONS': engine_options(config[config_name], slots)
+    })
+    _worker['app'] = app
+
+    if app.config['WORKER_WARMUP']:
+        warm_up(app, slots)
+
+    return app
+
+
+def warm_up(app, slots):
+    """
+    Open the connection pool and Redis client before the first task arrives
+
+    Args:
+        app: Worker app
+        slots: Number of database connections to open
+    """
+    start = time.time()
+    try:
+        with app.app_context():
+            connections = [db.engine.connect() for _ in range(slots)]
+            for connection in connections:
+                connection.execute(text('SELECT 1'))
+            for connection in connections:
+                connection.close()
+            get_redis().ping()
+        print(f"[Worker] Warmed up {slots} database connections in pid {os.getpid()} "
+              f"({time.time() - start:.2f}s)")
+    except Exception as e:
+        # Tasks connect on demand, so a failed warm-up only costs latency
+        print(f"[Worker Error] Warm-up failed in pid {os.getpid()}: {str(e)}")
+
+
+def dispose_engine(close=True):
+    """
+    Dispose of the engine of this process's app
+
+    Args:
+        close: Close pooled connections. Pass False in a forked child so the
+            parent's connections are dropped without touching their sockets.
+    """
+    app = _worker['app']
+    if app is None:
+        return
+    with app.app_context():
+        db.engine.dispose(close=close)
+
+
+def queue_tasks(queue):
+    """Return the names of the tasks routed to a queue"""
+    names = [name for name, target in TASK_QUEUES.items() if target == queue]
+    if queue in INGEST_QUEUES:
+        names.append(UPLOAD_TASK)
+    return names
+
+
+def apply_rate_limits(worker, app_config):
+    """
+    Apply QUEUE_RATE_LIMITS to the tasks of the queues a worker consumes
+
+    Celery rate limits are per task type and per worker, so with one worker
+    per queue (see run.sh) they act as per-queue limits.
+
+    Args:
+        worker: Celery WorkController being initialized
+        app_config: Config class of the worker
+    """
+    consumed = worker.app.amqp.queues.consume_from or worker.app.amqp.queues
+    for queue in consumed:
+        limit = app_config.QUEUE_RATE_LIMITS.get(queue)
+        if not limit:
+            continue
+        for name in queue_tasks(queue):
+            worker.app.tasks[name].rate_limit = limit
+            print(f"[Worker] Rate limit {limit} for {name} on queue {queue}")
+
+
+def get_worker_app():
+    """
+    Return the app of this worker process, creating it on first use
+
+    Outside a worker (eager tasks, scripts) the app is built lazily with a
+    single pooled connection.
+    """
+    return _worker['app'] or build_worker_app(1)
+
+
+@signals.worker_init.connect
+def on_worker_init(sender=None, **kwargs):
+    """Record the pool type, apply queue rate limits and build the app for thread and greenlet pools"""
+    _worker['pool'] = pool_name(sender.pool_cls)
+    _worker['concurrency'] = sender.concurrency or 1
+    apply_rate_limits(sender, config[os.environ.get('FLASK_ENV') or 'default'])
+
+    if _worker['pool'] not in PROCESS_POOLS:
+        build_worker_app(_worker['concurrency'])
+
+
+@signals.worker_process_init.connect
+def on_worker_process_init(**kwargs):
+    """Replace any engine inherited from the parent and build this child's app"""
+    dispose_engine(close=False)
+    _worker['app'] = None
+    build_worker_app(1)
+
+
+@signals.worker_process_shutdown.connect
+@signals.worker_shutdown.connect
+def on_worker_shutdown(**kwargs):
+    """Return the database connections of this process"""
+    dispose_engine()
@@ -0,0 +1,488 @@
+#!/usr/bin/env python3
+"""
+Ingestion benchmark for process_csv_upload
+
+Generates deterministic synthetic catalogs and runs the upload task
+in-process against the configured database, recording throughput, peak RSS,
+database round trips and time per ingestion stage.
+
+Usage:
+    python benchmark.py generate --rows 100000 --output catalog.csv
+    python benchmark.py run --scenario 100k --output results.json
+    python benchmark.py run --scenario 1m --mode orm --baseline baseline.json
+    python benchmark.py compare results.json baseline.json
+
+Benchmark products use SKUs starting with BENCH- and are deleted before every
+run, together with earlier benchmark upload jobs.
+"""
+from app import db
+from app.celery_app import celery
+from app.models import UploadJob
+from app.tasks import process_csv_upload
+from app.worker import get_worker_app
+from celery import signals
+from celery.utils import uuid
+from sqlalchemy import event
+from sqlalchemy.sql import text
+from datetime import datetime, timezone
+from array import array
+import argparse
+import csv
+import gzip
+import hashlib
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+SKU_PREFIX = 'BENCH-'
+JOB_PREFIX = 'benchmark-'
+
+# Named catalogs, so results of different releases describe the same input
+SCENARIOS = {
+    '100k': {'rows': 100_000, 'duplicate_rate': 0.01, 'update_rate': 0.2, 'description_length': 80,
+             'dirty_rate': 0.001},
+    '1m': {'rows': 1_000_000, 'duplicate_rate': 0.01, 'update_rate': 0.2, 'description_length': 80,
+           'dirty_rate': 0.001},
+    '5m': {'rows': 5_000_000, 'duplicate_rate': 0.01, 'update_rate': 0.2, 'description_length': 80,
+           'dirty_rate': 0.001},
+    'updates': {'rows': 500_000, 'duplicate_rate': 0.0, 'update_rate': 0.9, 'description_length': 80,
+                'dirty_rate': 0.0},
+    'wide': {'rows': 250_000, 'duplicate_rate': 0.01, 'update_rate': 0.2, 'description_length': 2000,
+             'dirty_rate': 0.0},
+    'dirty': {'rows': 250_000, 'duplicate_rate': 0.05, 'update_rate': 0.2, 'description_length': 80,
+              'dirty_rate': 0.05},
+}
+
+# Metrics compared against a baseline, and whether higher values are better
+COMPARED_METRICS = {
+    'rows_per_sec': True,
+    'peak_rss_mb': False,
+    'db_round_trips': False,
+}
+
+WORDS = (
+    'steel cotton oak compact wireless ergonomic premium classic modern portable durable organic '
+    'matte glossy vintage smart heavy light outdoor indoor kitchen office travel garden'
+).split()
+
+
+def generate_catalog(path, rows, seed=0, duplicate_rate=0.0, update_rate=0.0, description_length=80,
+                     dirty_rate=0.0):
+    """
+    Write a deterministic synthetic catalog CSV
+
+    Rows update one of the products created by reset_catalog with probability
+    update_rate, repeat the SKU of an earlier row with probability
+    duplicate_rate, and are invalid (missing SKU or name, bad price, overlong
+    name) with probability dirty_rate. The same arguments always produce the
+    same file.
+
+    Args:
+        path: Output path, gzip-compressed when it ends in .gz
+        rows: Number of data rows
+        seed: Random seed
+        duplicate_rate: Fraction of rows repeating an earlier SKU of the file
+        update_rate: Fraction of rows updating an existing product
+        description_length: Approximate description length in characters
+        dirty_rate: Fraction of rows failing validation
+
+    Returns:
+        Dict with the number of rows of each kind
+    """
+    rng = random.Random(seed)
+    existing = existing_products(rows, update_rate)
+    numbers = array('q')
+    counts = {'rows': rows, 'inserts': 0, 'updates': 0, 'duplicates': 0, 'dirty': 0}
+    next_update = 0
+    next_insert = existing
+
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'wt', newline='', encoding='utf-8') as fh:
+        writer = csv.writer(fh)
+        writer.writerow(['sku', 'name', 'description', 'price'])
+
+        for i in range(rows):
+            roll = rng.random()
+            if roll < dirty_rate:
+                counts['dirty'] += 1
+                writer.writerow(dirty_row(i, rng))
+                continue
+
+            if roll < dirty_rate + duplicate_rate and numbers:
+                number = numbers[rng.randrange(len(numbers))]
+                counts['duplicates'] += 1
+            elif next_update < existing and rng.random() < update_rate:
+                number = next_update
+                next_update += 1
+                counts['updates'] += 1
+            else:
+                number = next_insert
+                next_insert += 1
+                counts['inserts'] += 1
+            numbers.append(number)
+
+            writer.writerow([
+                f'{SKU_PREFIX}{number:09d}',
+                f'Product {number} {rng.choice(WORDS)}',
+                description(rng, description_length),
+                f'{rng.randint(100, 99999) / 100:.2f}'
+            ])
+
+    return counts
+
+
+def existing_products(rows, update_rate):
+    """Number of products reset_catalog creates for a catalog"""
+    return int(rows * update_rate)
+
+
+def dirty_row(i, rng):
+    """Return an invalid row, cycling through the validation failures"""
+    kind = i % 4
+    if kind == 0:
+        return ['', f'No sku {i}', 'missing sku', '1.00']
+    if kind == 1:
+        return [f'{SKU_PREFIX}DIRTY-{i}', '', 'missing name', '1.00']
+    if kind == 2:
+        return [f'{SKU_PREFIX}DIRTY-{i}', f'Bad price {i}', 'bad price', rng.choice(['abc', '1e12', '-'])]
+    return [f'{SKU_PREFIX}DIRTY-{i}', 'x' * 300, 'name too long', '1.00']
+
+
+def description(rng, length):
+    """Random words adding up to roughly length characters"""
+    words = []
+    size = 0
+    while size < length:
+        word = rng.choice(WORDS)
+        words.append(word)
+        size += len(word) + 1
+    return ' '.join(words)
+
+
+def reset_catalog(existing):
+    """
+    Delete benchmark products and jobs, then create the products updated by the run
+
+    Args:
+        existing: Number of products to create (SKUs BENCH-000000000 upwards)
+    """
+    db.session.execute(text("DELETE FROM upload_jobs WHERE filename LIKE :prefix"), {'prefix': f'{JOB_PREFIX}%'})
+    db.session.execute(text("DELETE FROM products WHERE sku LIKE :prefix"), {'prefix': f'{SKU_PREFIX}%'})
+    if existing:
+        db.session.execute(text("""
+            INSERT INTO products (sku, name, description, price, active, created_at, updated_at)
+            SELECT :prefix || lpad(n::text, 9, '0'), 'Seeded ' || n, 'seeded', 1, TRUE, now(), now()
+            FROM generate_series(0, :existing - 1) AS n
+        """), {'prefix': SKU_PREFIX, 'existing': existing})
+    db.session.commit()
+    db.session.execute(text("ANALYZE products"))
+    db.session.commit()
+
+
+class RssSampler(threading.Thread):
+    """Sample the resident set size of this process and keep the peak"""
+
+    def __init__(self, interval=0.05):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak = current_rss()
+        self.running = True
+
+    def run(self):
+        while self.running:
+            self.peak = max(self.peak, current_rss())
+            time.sleep(self.interval)
+
+    def stop(self):
+        self.running = False
+        self.join()
+        return max(self.peak, current_rss())
+
+
+def current_rss():
+    """Resident set size of this process in bytes"""
+    try:
+        with open('/proc/self/statm') as fh:
+            return int(fh.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        # No procfs (macOS): fall back to the lifetime peak, reported in bytes there
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class RoundTripCounter:
+    """Count statements and commits sent through the SQLAlchemy engine"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements = 0
+        self.commits = 0
+
+    def on_execute(self, *args, **kwargs):
+        self.statements += 1
+
+    def on_commit(self, *args, **kwargs):
+        self.commits += 1
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self.on_execute)
+        event.listen(self.engine, 'commit', self.on_commit)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self.on_execute)
+        event.remove(self.engine, 'commit', self.on_commit)
+
+
+def run_once(app, catalog_path, params, options):
+    """
+    Reset the catalog and ingest a generated file once
+
+    Returns:
+        Dict of metrics for the run
+    """
+    reset_catalog(existing_products(params['rows'], params['update_rate']))
+
+    filename = f"{JOB_PREFIX}{os.path.basename(catalog_path)}"
+    file_path = os.path.abspath(os.path.join(app.config['UPLOAD_FOLDER'], f'{uuid()}-{filename}'))
+    shutil.copyfile(catalog_path, file_path)
+
+    job = UploadJob(task_id=uuid(), filename=filename, file_path=file_path, status='pending')
+    db.session.add(job)
+    db.session.commit()
+    job_id = job.id
+
+    # Parallel uploads complete in finalize_csv_upload, so results are taken from whichever task finishes the job
+    results = []
+
+    def on_success(sender=None, result=None, **kwargs):
+        if isinstance(result, dict) and result.get('job_id') == job_id and result.get('status') == 'completed':
+            results.append(result)
+
+    signals.task_success.connect(on_success, weak=False)
+    sampler = RssSampler()
+    sampler.start()
+    try:
+        with RoundTripCounter(db.engine) as round_trips:
+            start = time.perf_counter()
+            process_csv_upload.apply(args=[file_path, job_id], kwargs=options, throw=True)
+            wall = time.perf_counter() - start
+    finally:
+        peak_rss = sampler.stop()
+        signals.task_success.disconnect(on_success)
+
+    db.session.expire_all()
+    job = db.session.get(UploadJob, job_id)
+    if job.status != 'completed':
+        raise RuntimeError(f"Benchmark upload {job_id} ended as {job.status}: {job.error_message}")
+
+    result = results[-1] if results else {}
+    return {
+        'wall_seconds': round(wall, 3),
+        'rows_per_sec': round((job.processed_rows + (job.rejected_rows or 0)) / wall, 1) if wall else 0,
+        'peak_rss_mb': round(peak_rss / (1024 * 1024), 1),
+        'db_round_trips': round_trips.statements + round_trips.commits,
+        'db_statements': round_trips.statements,
+        'db_commits': round_trips.commits,
+        'stages': result.get('stages', {}),
+        'processed': job.processed_rows,
+        'inserted': job.inserted_rows,
+        'updated': job.updated_rows,
+        'unchanged': job.unchanged_rows,
+        'rejected': job.rejected_rows,
+    }
+
+
+def summarize(runs):
+    """Median of each metric across runs"""
+    summary = {metric: statistics.median(run[metric] for run in runs)
+               for metric in ('wall_seconds', 'rows_per_sec', 'peak_rss_mb', 'db_round_trips')}
+    stages = sorted({stage for run in runs for stage in run['stages']})
+    summary['stages'] = {stage: round(statistics.median(run['stages'].get(stage, 0) for run in runs), 4)
+                         for stage in stages}
+    return summary
+
+
+def environment():
+    """Describe the code and machine the benchmark ran on"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """
+    Compare benchmark results against a baseline
+
+    Args:
+        results: Results dict written by run
+        baseline: Baseline results dict
+        tolerance: Allowed relative change before a metric counts as a regression
+
+    Returns:
+        List of regression messages, empty when none was found
+    """
+    if results['params'] != baseline['params'] or results['options'] != baseline['options']:
+        print("[Benchmark] Warning: results and baseline were run with different parameters")
+
+    regressions = []
+    for metric, higher_is_better in COMPARED_METRICS.items():
+        value = results['summary'][metric]
+        reference = baseline['summary'][metric]
+        if not reference:
+            continue
+
+        change = (value - reference) / reference
+        worse = -change if higher_is_better else change
+        status = 'REGRESSION' if worse > tolerance else 'ok'
+        print(f"[Benchmark] {metric}: {value} vs {reference} ({change:+.1%}) {status}")
+        if worse > tolerance:
+            regressions.append(f"{metric} {change:+.1%} (tolerance {tolerance:.0%})")
+
+    return regressions
+
+
+def catalog_params(args):
+    """Generator parameters from a scenario and command-line overrides"""
+    params = dict(SCENARIOS[args.scenario]) if args.scenario else dict(SCENARIOS['100k'])
+    for name in ('rows', 'duplicate_rate', 'update_rate', 'description_length', 'dirty_rate'):
+        value = getattr(args, name)
+        if value is not None:
+            params[name] = value
+    params['seed'] = args.seed
+    return params
+
+
+def cached_catalog(params, workdir, compress):
+    """Generate a catalog once per set of parameters and reuse it"""
+    digest = hashlib.sha1(json.dumps(params, sort_keys=True).encode('utf-8')).hexdigest()[:12]
+    path = os.path.join(workdir, f"catalog-{params['rows']}-{digest}.csv" + ('.gz' if compress else ''))
+    if not os.path.exists(path):
+        os.makedirs(workdir, exist_ok=True)
+        start = time.perf_counter()
+        counts = generate_catalog(path, **params)
+        print(f"[Benchmark] Generated {path} in {time.perf_counter() - start:.1f}s: {counts}")
+    return path
+
+
+def command_generate(args):
+    params = catalog_params(args)
+    counts = generate_catalog(args.output, **params)
+    print(json.dumps({'path': args.output, 'params': params, 'counts': counts}, indent=2))
+
+
+def command_run(args):
+    params = catalog_params(args)
+    options = {'mode': args.mode, 'streaming': True, 'parallel': args.parallel, 'delta': args.delta,
+               'max_errors': -1}
+
+    # Range subtasks and the finalizer run inline as well, on the app (and engine) the tasks use
+    celery.conf.task_always_eager = True
+    app = get_worker_app()
+
+    with app.app_context():
+        catalog_path = cached_catalog(params, args.workdir, args.gzip)
+        runs = []
+        for i in range(args.repeat):
+            run = run_once(app, catalog_path, params, options)
+            print(f"[Benchmark] Run {i + 1}/{args.repeat}: {run['rows_per_sec']} rows/s, "
+                  f"{run['wall_seconds']}s, peak RSS {run['peak_rss_mb']}MB, "
+                  f"{run['db_round_trips']} round trips, stages {run['stages']}")
+            runs.append(run)
+        reset_catalog(0)
+
+    results = {
+        'scenario': args.scenario,
+        'params': params,
+        'options': {**options, 'gzip': args.gzip},
+        'environment': environment(),
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'runs': runs,
+        'summary': summarize(runs),
+    }
+
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump(results, fh, indent=2)
+        print(f"[Benchmark] Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as fh:
+            regressions = compare(results, json.load(fh), args.tolerance)
+        if regressions:
+            print(f"[Benchmark] Regressions: {'; '.join(regressions)}")
+            sys.exit(1)
+
+
+def command_compare(args):
+    with open(args.results) as fh:
+        results = json.load(fh)
+    with open(args.baseline) as fh:
+        baseline = json.load(fh)
+
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"[Benchmark] Regressions: {'; '.join(regressions)}")
+        sys.exit(1)
+
+
+def add_catalog_arguments(parser):
+    parser.add_argument('--scenario', choices=sorted(SCENARIOS), help='Named catalog (default 100k)')
+    parser.add_argument('--rows', type=int)
+    parser.add_argument('--duplicate-rate', type=float)
+    parser.add_argument('--update-rate', type=float)
+    parser.add_argument('--description-length', type=int)
+    parser.add_argument('--dirty-rate', type=float)
+    parser.add_argument('--seed', type=int, default=0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark CSV ingestion')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    generate = commands.add_parser('generate', help='Write a synthetic catalog CSV')
+    add_catalog_arguments(generate)
+    generate.add_argument('--output', required=True, help='CSV path, gzip-compressed if it ends in .gz')
+    generate.set_defaults(handler=command_generate)
+
+    run = commands.add_parser('run', help='Ingest a synthetic catalog and record metrics')
+    add_catalog_arguments(run)
+    run.add_argument('--mode', choices=['bulk', 'orm'], default='bulk')
+    run.add_argument('--parallel', type=int, default=1, help='Maximum byte ranges (bulk mode)')
+    run.add_argument('--delta', action='store_true', help='Skip unchanged products (off by default, as in the app)')
+    run.add_argument('--gzip', action='store_true', help='Ingest a gzip-compressed copy of the catalog')
+    run.add_argument('--repeat', type=int, default=1, help='Runs to take the median of')
+    run.add_argument('--workdir', default=os.path.join('uploads', 'benchmark'), help='Where catalogs are cached')
+    run.add_argument('--output', help='Write results as JSON')
+    run.add_argument('--baseline', help='Results JSON to compare against; exits 1 on a regression')
+    run.add_argument('--tolerance', type=float, default=0.1)
+    run.set_defaults(handler=command_run)
+
+    compare_parser = commands.add_parser('compare', help='Compare two results files')
+    compare_parser.add_argument('results')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('--tolerance', type=float, default=0.1)
+    compare_parser.set_defaults(handler=command_compare)
+
+    args = parser.parse_args()
+    args.handler(args)
+
+
+if __name__ == '__main__':
+    main()
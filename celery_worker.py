@@ -1,16 +1,13 @@
 """
 Celery worker entry point
+
+Each worker process creates its own Flask app and database engine through the
+signal handlers in app.worker, so nothing is built here before the fork.
 """
 from app.celery_app import celery
-from app import create_app
-import os
-
-# Create Flask app context for Celery
-app = create_app(os.environ.get('FLASK_ENV', 'default'))
-app.app_context().push()
 
 # Import tasks to register them
-from app.tasks import process_csv_upload
+from app.tasks import process_csv_upload, delete_products, deliver_webhook, flush_webhook_batch
 
 if __name__ == '__main__':
     celery.start()
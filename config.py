@@ -18,12 +18,76 @@ class Config:
     }
 
     REDIS_URL = os.environ.get('REDIS_URL')
+    # Seconds a cached product response is kept for one catalog version
+    CATALOG_CACHE_TTL = int(os.environ.get('CATALOG_CACHE_TTL', 300))
+    # Maximum number of items accepted by POST /api/products/batch
+    PRODUCT_BATCH_MAX_ITEMS = int(os.environ.get('PRODUCT_BATCH_MAX_ITEMS', 5000))
+    # Rows removed per transaction by background bulk deletes
+    BULK_DELETE_BATCH_SIZE = int(os.environ.get('BULK_DELETE_BATCH_SIZE', 5000))
+    # Milliseconds an unfiltered bulk delete waits for the TRUNCATE lock before
+    # falling back to a batched background delete
+    BULK_DELETE_LOCK_TIMEOUT_MS = int(os.environ.get('BULK_DELETE_LOCK_TIMEOUT_MS', 2000))
 
     CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL')
     CELERY_RESULT_BACKEND = os.environ.get('CELERY_RESULT_BACKEND')
 
     MAX_CONTENT_LENGTH = int(os.environ.get('MAX_CONTENT_LENGTH'))  # 500MB
     UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER', 'uploads')
+    # Hours the file of a failed upload or abandoned upload session is kept for a resume
+    UPLOAD_RETENTION_HOURS = int(os.environ.get('UPLOAD_RETENTION_HOURS', 72))
+
+    # 'bulk' merges each chunk through a COPY staging table, 'orm' upserts row by row
+    INGEST_MODE = os.environ.get('INGEST_MODE', 'bulk')
+    # Parse the file once and report progress by bytes instead of counting rows first
+    INGEST_STREAMING = os.environ.get('INGEST_STREAMING', 'true').lower() == 'true'
+    # Fan bulk uploads out across workers as byte ranges of at least INGEST_RANGE_MIN_BYTES
+    INGEST_PARALLEL_RANGES = int(os.environ.get('INGEST_PARALLEL_RANGES', 1))
+    INGEST_RANGE_MIN_BYTES = int(os.environ.get('INGEST_RANGE_MIN_BYTES', 16 * 1024 * 1024))
+    # 'pandas' or 'pyarrow' (optional dependency, falls back to pandas when missing)
+    CSV_PARSER = os.environ.get('CSV_PARSER', 'pandas')
+    # Only write new or changed products and skip files identical to the last completed upload
+    INGEST_DELTA = os.environ.get('INGEST_DELTA', 'false').lower() == 'true'
+    # Rejected rows tolerated per upload before it is aborted (-1 for no limit)
+    INGEST_MAX_ERRORS = int(os.environ.get('INGEST_MAX_ERRORS', 1000))
+    # Automatic resumes from the last checkpoint after a soft time limit or DB outage
+    INGEST_MAX_RESUMES = int(os.environ.get('INGEST_MAX_RESUMES', 3))
+
+    # Record request, task, ingestion and webhook metrics in Redis and serve them on /metrics
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+
+    # Profile requests sent with a signed X-Profile-Token and uploads queued with profile=true
+    PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', 'false').lower() == 'true'
+    PROFILE_FOLDER = os.environ.get('PROFILE_FOLDER', 'profiles')
+    PROFILE_TOKEN_MAX_AGE = int(os.environ.get('PROFILE_TOKEN_MAX_AGE', 3600))  # seconds
+
+    # Uploads up to this many bytes (compressed files weighted 8x) use the 'ingest_small' queue
+    INGEST_SMALL_FILE_BYTES = int(os.environ.get('INGEST_SMALL_FILE_BYTES', 32 * 1024 * 1024))
+    # Tasks waiting in the broker queue of an upload before /api/upload answers 429 (0 for no limit)
+    UPLOAD_MAX_BACKLOG = int(os.environ.get('UPLOAD_MAX_BACKLOG', 20))
+    UPLOAD_RETRY_AFTER = int(os.environ.get('UPLOAD_RETRY_AFTER', 60))  # seconds
+    # Progress streams per web process (each holds a gunicorn thread) and seconds before one
+    # is closed for the browser to reconnect
+    UPLOAD_STREAM_MAX_OPEN = int(os.environ.get('UPLOAD_STREAM_MAX_OPEN', 8))
+    UPLOAD_STREAM_MAX_SECONDS = int(os.environ.get('UPLOAD_STREAM_MAX_SECONDS', 60))
+    # Celery rate limit per worker for the tasks of each queue, e.g. '10/m' (unset for none)
+    QUEUE_RATE_LIMITS = {
+        'ingest_bulk': os.environ.get('INGEST_BULK_RATE_LIMIT'),
+        'ingest_small': os.environ.get('INGEST_SMALL_RATE_LIMIT'),
+        'webhooks': os.environ.get('WEBHOOKS_RATE_LIMIT'),
+        'exports': os.environ.get('EXPORTS_RATE_LIMIT')
+    }
+
+    # Celery worker processes keep one engine each, sized to the tasks they run at once
+    WORKER_DB_MAX_OVERFLOW = int(os.environ.get('WORKER_DB_MAX_OVERFLOW', 2))
+    # Open the worker's database connections before its first task
+    WORKER_WARMUP = os.environ.get('WORKER_WARMUP', 'true').lower() == 'true'
+
+    # Webhook deliveries run on the 'webhooks' Celery queue
+    WEBHOOK_TIMEOUT = float(os.environ.get('WEBHOOK_TIMEOUT', 10))
+    WEBHOOK_MAX_RETRIES = int(os.environ.get('WEBHOOK_MAX_RETRIES', 5))
+    WEBHOOK_RETRY_BACKOFF = int(os.environ.get('WEBHOOK_RETRY_BACKOFF', 2))  # seconds, doubled per retry
+    # Days delivery records are kept in webhook_deliveries, 0 keeps them forever
+    WEBHOOK_DELIVERY_RETENTION_DAYS = int(os.environ.get('WEBHOOK_DELIVERY_RETENTION_DAYS', 30))
 
     @staticmethod
     def init_app(app):
@@ -1,18 +1,60 @@
 from app import create_app, db
+from app.models import CONTENT_HASH_SQL
 import os
 from sqlalchemy.sql import text
 
+# create_all() does not alter existing tables, so columns and indexes added
+# after the initial schema are applied here
+SCHEMA_UPGRADES = [
+    "ALTER TABLE upload_jobs ADD COLUMN IF NOT EXISTS inserted_rows INTEGER DEFAULT 0",
+    "ALTER TABLE upload_jobs ADD COLUMN IF NOT EXISTS updated_rows INTEGER DEFAULT 0",
+    "ALTER TABLE upload_jobs ADD COLUMN IF NOT EXISTS file_size BIGINT DEFAULT 0",
+    "ALTER TABLE upload_jobs ADD COLUMN IF NOT EXISTS bytes_processed BIGINT DEFAULT 0",
+    "ALTER TABLE upload_jobs ADD COLUMN IF NOT EXISTS file_path VARCHAR(1024)",
+    "ALTER TABLE upload_jobs ADD COLUMN IF NOT EXISTS checkpoint_offset BIGINT DEFAULT 0",
+    "ALTER TABLE upload_jobs ADD COLUMN IF NOT EXISTS checkpoint_chunk INTEGER DEFAULT 0",
+    "ALTER TABLE upload_jobs ADD COLUMN IF NOT EXISTS job_type VARCHAR(50) NOT NULL DEFAULT 'upload'",
+    "ALTER TABLE upload_jobs ADD COLUMN IF NOT EXISTS bytes_received BIGINT DEFAULT 0",
+    "ALTER TABLE upload_jobs ADD COLUMN IF NOT EXISTS unchanged_rows INTEGER DEFAULT 0",
+    "ALTER TABLE upload_jobs ADD COLUMN IF NOT EXISTS file_checksum VARCHAR(64)",
+    "CREATE INDEX IF NOT EXISTS ix_upload_jobs_file_checksum ON upload_jobs (file_checksum)",
+    "ALTER TABLE upload_jobs ADD COLUMN IF NOT EXISTS rejected_rows INTEGER DEFAULT 0",
+    "ALTER TABLE upload_jobs ADD COLUMN IF NOT EXISTS stage_seconds JSON",
+    "ALTER TABLE upload_jobs ADD COLUMN IF NOT EXISTS catalog_version BIGINT",
+    "ALTER TABLE upload_jobs ADD COLUMN IF NOT EXISTS options JSON",
+    "ALTER TABLE products ADD COLUMN IF NOT EXISTS content_hash VARCHAR(32) GENERATED ALWAYS AS ("
+    + CONTENT_HASH_SQL.format(name='name', description='description', price='price') + ") STORED",
+    "ALTER TABLE webhooks ADD COLUMN IF NOT EXISTS batch_enabled BOOLEAN NOT NULL DEFAULT FALSE",
+    "ALTER TABLE webhooks ADD COLUMN IF NOT EXISTS batch_window INTEGER NOT NULL DEFAULT 10",
+    "ALTER TABLE webhooks ADD COLUMN IF NOT EXISTS batch_max_events INTEGER NOT NULL DEFAULT 100",
+    "ALTER TABLE webhooks ADD COLUMN IF NOT EXISTS batch_gzip BOOLEAN NOT NULL DEFAULT FALSE",
+    "CREATE INDEX IF NOT EXISTS ix_webhook_deliveries_created_at ON webhook_deliveries (created_at)",
+    "CREATE INDEX IF NOT EXISTS ix_products_created_at_id ON products (created_at, id)",
+    # Indexed search: trigram indexes for SKU/name substrings, full-text for descriptions
+    "CREATE INDEX IF NOT EXISTS ix_products_sku_trgm ON products USING gin ((sku::text) gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_products_name_trgm ON products USING gin (name gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_products_description_tsv ON products "
+    "USING gin (to_tsvector('simple', COALESCE(description, '')))",
+]
+
+
 def init_database():
     """Initialize the database"""
     app = create_app(os.environ.get('FLASK_ENV'))
 
     with app.app_context():
         db.session.execute(text("CREATE EXTENSION IF NOT EXISTS citext;"))
+        db.session.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm;"))
         db.session.commit()
 
-        print("CITEXT extension enabled.")
+        print("CITEXT and pg_trgm extensions enabled.")
         db.create_all()
         print("Database tables created successfully!")
 
+        for statement in SCHEMA_UPGRADES:
+            db.session.execute(text(statement))
+        db.session.commit()
+        print("Schema upgrades applied.")
+
 if __name__ == '__main__':
     init_database()
@@ -4,10 +4,18 @@ set -e
 
 python init_db.py
 
-gunicorn run:app --bind 0.0.0.0:$PORT --timeout 300 --log-level info --workers 1 &
+# Threaded workers so long-lived progress streams do not block other requests
+gunicorn run:app --bind 0.0.0.0:$PORT --timeout 300 --log-level info --workers 1 --worker-class gthread --threads 16 &
 
+# One worker per queue, so a large import never holds up small uploads or webhooks
 if [[ "$OSTYPE" == "darwin"* ]]; then
-    celery -A celery_worker.celery worker --loglevel=info --pool=solo
+    celery -A celery_worker.celery worker --loglevel=info --pool=solo -Q webhooks -n webhooks@%h &
+    celery -A celery_worker.celery worker --loglevel=info --pool=solo -Q ingest_small -n ingest_small@%h &
+    celery -A celery_worker.celery worker --loglevel=info --pool=solo -Q exports -n exports@%h --beat &
+    celery -A celery_worker.celery worker --loglevel=info --pool=solo -Q ingest_bulk -n ingest_bulk@%h
 else
-    celery -A celery_worker.celery worker --loglevel=info --concurrency=2
-fi
\ No newline at end of file
+    celery -A celery_worker.celery worker --loglevel=info --concurrency=${WEBHOOKS_CONCURRENCY:-8} -Q webhooks -n webhooks@%h &
+    celery -A celery_worker.celery worker --loglevel=info --concurrency=${INGEST_SMALL_CONCURRENCY:-4} -Q ingest_small -n ingest_small@%h &
+    celery -A celery_worker.celery worker --loglevel=info --concurrency=${EXPORTS_CONCURRENCY:-1} -Q exports -n exports@%h --beat &
+    celery -A celery_worker.celery worker --loglevel=info --concurrency=${INGEST_BULK_CONCURRENCY:-2} -Q ingest_bulk -n ingest_bulk@%h
+fi
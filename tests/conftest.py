@@ -0,0 +1,8 @@
+import os
+import sys
+
+# config.py reads these at import time; tests that need services use the real values
+os.environ.setdefault('MAX_CONTENT_LENGTH', '524288000')
+os.environ.setdefault('SECRET_KEY', 'test')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
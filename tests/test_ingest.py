@@ -0,0 +1,253 @@
+"""
+Tests for splitting CSV files into byte ranges, validating and normalizing
+chunks, and merging them
+
+The database test needs DATABASE_URL pointing at a Postgres with the schema
+from init_db.py and is skipped otherwise.
+"""
+import csv
+import io
+import os
+import pandas as pd
+import pytest
+from sqlalchemy.sql import text
+from app.ingest import (
+    bulk_upsert_chunk, clear_range_staging, iter_csv_chunks, merge_range_staging, normalize_chunk,
+    split_csv_ranges, stage_range_rows, validate_chunk
+)
+
+
+def make_csv(rows):
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator='\n')
+    writer.writerow(['sku', 'name', 'description', 'price'])
+    writer.writerows(rows)
+    return buf.getvalue().encode('utf-8')
+
+
+def multiline_rows(count):
+    """Rows whose descriptions span lines and contain quotes and commas"""
+    rows = []
+    for i in range(count):
+        description = f'line one of {i}\n"quoted, line two"\nline three' if i % 3 == 0 else f'plain {i}'
+        rows.append([f'SKU-{i}', f'Product {i}', description, f'{i}.50'])
+    return rows
+
+
+def read_records(data, chunk_size=7, start=None, end=None):
+    records = []
+    for chunk_df, _ in iter_csv_chunks(io.BytesIO(data), chunk_size, start, end):
+        records.extend(chunk_df.fillna('').values.tolist())
+    return records
+
+
+@pytest.mark.parametrize('parts', [1, 2, 3, 5, 8, 50])
+def test_ranges_cover_every_record_once(parts):
+    rows = multiline_rows(60)
+    data = make_csv(rows)
+
+    ranges = split_csv_ranges(io.BytesIO(data), parts)
+
+    assert ranges[0][0] == data.index(b'\n') + 1
+    assert ranges[-1][1] == len(data)
+    assert all(end == next_start for (_, end), (next_start, _) in zip(ranges, ranges[1:]))
+
+    records = []
+    for start, end in ranges:
+        records.extend(read_records(data, start=start, end=end))
+    assert records == rows
+
+
+def test_split_points_never_fall_inside_quoted_fields():
+    # One record holding most of the file, so every target offset lands inside it
+    rows = [['SKU-0', 'first', 'short', '1.00'],
+            ['SKU-1', 'long', '\n'.join(f'"{i}", more' for i in range(500)), '2.00'],
+            ['SKU-2', 'last', 'short', '3.00']]
+    data = make_csv(rows)
+
+    ranges = split_csv_ranges(io.BytesIO(data), 4)
+
+    for start, _ in ranges:
+        assert data[start - 1:start] == b'\n'
+        assert data[:start].count(b'"') % 2 == 0
+    assert [record for start, end in ranges for record in read_records(data, start=start, end=end)] == rows
+
+
+def test_chunk_offsets_resume_exactly():
+    rows = multiline_rows(40)
+    data = make_csv(rows)
+
+    chunks = list(iter_csv_chunks(io.BytesIO(data), 6))
+    assert sum(len(chunk_df) for chunk_df, _ in chunks) == len(rows)
+
+    # Resuming after any chunk reads exactly the remaining records
+    seen = 0
+    for chunk_df, offset in chunks:
+        seen += len(chunk_df)
+        assert read_records(data, start=offset) == rows[seen:]
+
+
+def stray_quote_csv(count):
+    """Unquoted rows with an inch mark in the name, which is data and not a quote"""
+    lines = [b'sku,name,description,price\n']
+    lines.extend(f'S{i},TV {i}" screen,d,1\n'.encode() for i in range(count))
+    return b''.join(lines)
+
+
+def test_stray_mid_field_quote_does_not_merge_chunks():
+    data = stray_quote_csv(5000)
+
+    chunks = list(iter_csv_chunks(io.BytesIO(data), 1000))
+
+    assert [len(chunk_df) for chunk_df, _ in chunks] == [1000] * 5
+    assert chunks[-1][0]['name'].iloc[-1] == 'TV 4999" screen'
+
+
+def test_stray_mid_field_quote_still_splits_into_ranges():
+    data = stray_quote_csv(5000)
+
+    ranges = split_csv_ranges(io.BytesIO(data), 4)
+
+    assert len(ranges) == 4
+    assert all(data[start - 1:start] == b'\n' for start, _ in ranges)
+    assert sum(len(read_records(data, 1000, start, end)) for start, end in ranges) == 5000
+
+
+def test_unterminated_quote_is_capped(monkeypatch):
+    monkeypatch.setattr('app.ingest.MAX_RECORD_BYTES', 1000)
+    data = make_csv([['S0', 'a', 'b', '1']]) + b'S1,"never closed,d,1\n' + b'S2,x,y,2\n' * 200
+
+    with pytest.raises(ValueError, match='Unterminated quoted field'):
+        list(iter_csv_chunks(io.BytesIO(data), 1000))
+
+
+def product_frame(rows):
+    return pd.DataFrame(rows, columns=['sku', 'name', 'description', 'price'], dtype=object)
+
+
+def test_price_limit_applies_after_rounding_to_cents():
+    prices = ['99999999.99', '99999999.994', '99999999.995', '99999999.999', '100000000']
+    chunk_df = product_frame([[f'P-{i}', 'name', None, price] for i, price in enumerate(prices)])
+
+    valid_df, rejects = validate_chunk(chunk_df, 0, 0)
+
+    assert valid_df['price'].tolist() == ['99999999.99', '99999999.994']
+    assert [reject[6] for reject in rejects] == ['99999999.995', '99999999.999', '100000000']
+    assert all(reject[2] == 'price is out of range' for reject in rejects)
+
+
+def test_validate_chunk_rejects_invalid_rows():
+    chunk_df = product_frame([
+        ['OK-1', 'fine', 'kept', '9.99'],
+        ['BAD-1', 'nan price', None, 'NaN'],
+        ['BAD-2', 'infinite price', None, 'inf'],
+        ['BAD-3', 'negative price', None, '-0.01'],
+        ['BAD-4', 'huge price', None, '123456789'],
+        ['BAD-5', 'n' * 256, None, '1.00'],
+        ['OK-2', ' n' * 100 + ' ', None, None],
+        [None, None, 'no sku or name', 'abc'],
+    ])
+
+    valid_df, rejects = validate_chunk(chunk_df, 100, 10)
+
+    assert valid_df['sku'].tolist() == ['OK-1', 'OK-2']
+    assert [(reject[0], reject[1], reject[2]) for reject in rejects] == [
+        (12, 101, 'price is not a number'),
+        (13, 102, 'price is out of range'),
+        (14, 103, 'price is out of range'),
+        (15, 104, 'price is out of range'),
+        (16, 105, 'name is longer than 255 characters'),
+        (18, 107, 'sku is required; name is required; price is not a number'),
+    ]
+    assert rejects[-1][3:] == (None, None, 'no sku or name', 'abc')
+
+
+def test_validate_chunk_requires_sku_and_name_columns():
+    with pytest.raises(ValueError, match='missing required columns: name'):
+        validate_chunk(pd.DataFrame({'sku': ['A']}), 0, 0)
+
+
+def test_normalize_chunk_folds_rows_per_sku():
+    chunk_df = product_frame([
+        [' Fold-1 ', 'first', 'described', '1.00'],
+        ['other', 'single', None, None],
+        ['FOLD-1', '  ', None, '2.50'],
+        ['fold-1', 'renamed', '', None],
+        [' ', 'no sku', None, None],
+    ])
+
+    rows = normalize_chunk(chunk_df, 1000)
+
+    assert rows == [
+        (1003, 'Fold-1', 'renamed', 'described', '2.50'),
+        (1001, 'other', 'single', None, None),
+    ]
+
+
+def duplicate_rows():
+    """Rows repeating SKUs across the file, some with blank fields"""
+    rows = []
+    for i in range(300):
+        rows.append([f'DUP-{i % 40}', f'name {i}', f'description {i}', f'{i}.25'])
+        if i % 7 == 0:
+            rows.append([f'DUP-{i % 40}', '', '', ''])
+        if i % 11 == 0:
+            rows.append([f'DUP-{(i * 3) % 40}', f'renamed {i}', '', f'{i}.75'])
+    return rows
+
+
+@pytest.fixture
+def app_context():
+    if not os.environ.get('DATABASE_URL'):
+        pytest.skip('DATABASE_URL is not set')
+
+    from app import create_app, db
+    app = create_app('development')
+    with app.app_context():
+        try:
+            db.session.execute(text('SELECT 1'))
+        except Exception as e:
+            pytest.skip(f'Database unavailable: {e}')
+        yield db
+        db.session.rollback()
+        db.session.execute(text("DELETE FROM products WHERE sku ILIKE 'DUP-%'"))
+        db.session.commit()
+
+
+def catalog(db):
+    return db.session.execute(text(
+        "SELECT sku::text, name, description, price FROM products WHERE sku ILIKE 'DUP-%' ORDER BY sku"
+    )).all()
+
+
+def reset_catalog(db):
+    db.session.execute(text("DELETE FROM products WHERE sku ILIKE 'DUP-%'"))
+    db.session.execute(text(
+        "INSERT INTO products (sku, name, description, price, active, created_at, updated_at) "
+        "VALUES ('DUP-1', 'stored', 'stored description', 9, TRUE, now(), now())"
+    ))
+
+
+def test_parallel_ranges_resolve_duplicates_like_a_serial_run(app_context):
+    db = app_context
+    data = make_csv(duplicate_rows())
+
+    reset_catalog(db)
+    chunk_start = 0
+    for chunk_df, offset in iter_csv_chunks(io.BytesIO(data), 50):
+        bulk_upsert_chunk(normalize_chunk(chunk_df, chunk_start))
+        chunk_start = offset
+    serial = catalog(db)
+
+    job_id = -1
+    reset_catalog(db)
+    clear_range_staging(job_id)
+    for start, end in split_csv_ranges(io.BytesIO(data), 4):
+        chunk_start = start
+        for chunk_df, offset in iter_csv_chunks(io.BytesIO(data), 50, start, end):
+            stage_range_rows(job_id, normalize_chunk(chunk_df, chunk_start))
+            chunk_start = offset
+    merge_range_staging(job_id)
+
+    assert catalog(db) == serial
+    assert len(serial) == 40
@@ -0,0 +1,56 @@
+"""
+Tests that FastJSONProvider encodes responses like Flask's default provider
+"""
+import math
+import pytest
+from datetime import datetime
+from decimal import Decimal
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+from app.json_provider import FastJSONProvider
+from app.models import Product
+
+pytest.importorskip('orjson')
+
+
+def encode(provider_class, payload):
+    app = Flask(__name__)
+    app.json = provider_class(app)
+    with app.app_context():
+        return app.json.response(payload).get_data()
+
+
+def product(index, name, price):
+    return Product(
+        id=index, sku=f'SKU-{index}', name=name, description='A "quoted" description\nover two lines',
+        price=price, active=index % 2 == 0,
+        created_at=datetime(2024, 5, 1, 12, 30, index), updated_at=datetime(2024, 5, 2, 8, 0, index)
+    )
+
+
+@pytest.mark.parametrize('payload', [
+    product(1, 'Widget', Decimal('19.99')).to_dict(),
+    {
+        'products': [
+            product(2, 'Gadget', Decimal('99999999.99')).to_dict(),
+            product(3, 'Free sample', None).to_dict(),
+            product(4, 'Crème brûlée', Decimal('0.01')).to_dict(),
+        ],
+        'next': None,
+        'per_page': 3,
+        'total': 12345678901234567890,
+        'ratio': 1e-7,
+        'when': datetime(2024, 5, 3, 9, 15),
+        'price': Decimal('5.50'),
+    },
+])
+def test_output_matches_default_provider(payload):
+    assert encode(FastJSONProvider, payload) == encode(DefaultJSONProvider, payload)
+
+
+def test_non_finite_floats_are_encoded_as_null():
+    # Documented difference: json writes NaN, which is not valid JSON
+    payload = {'response_time': math.nan, 'limit': math.inf}
+
+    assert encode(FastJSONProvider, payload) == b'{"limit":null,"response_time":null}\n'
+    assert encode(DefaultJSONProvider, payload) == b'{"limit":Infinity,"response_time":NaN}\n'
@@ -6,6 +6,7 @@ Then configure webhook URL: http://localhost:5003/webhook
 """
 from flask import Flask, request, jsonify, render_template_string
 from datetime import datetime
+import gzip
 import json
 
 app = Flask(__name__)
@@ -141,10 +142,19 @@ def index():
 @app.route('/webhook', methods=['POST'])
 def webhook():
     """Receive webhook POST requests"""
-    data = request.get_json()
+    body = request.get_data()
+    if request.headers.get('Content-Encoding') == 'gzip':
+        body = gzip.decompress(body)
+    data = json.loads(body)
+
+    # Batched deliveries are a JSON array of events
+    if isinstance(data, list):
+        event = f"batch ({len(data)} events)"
+    else:
+        event = data.get('event', 'unknown')
 
     webhook_data = {
-        'event': data.get('event', 'unknown'),
+        'event': event,
         'received_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
         'payload': json.dumps(data, indent=2)
     }